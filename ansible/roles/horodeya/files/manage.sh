@@ -11,5 +11,6 @@ export STREAM_API_SECRET='{{stream_api_secret}}'
 export DB_PASSWORD='{{db_password}}'
 export DB_NAME='{{db_name}}'
 export DB_USER='{{db_user}}'
+export MEMCACHED_LOCATION='127.0.0.1:11211'
 
 venv/bin/python manage.py $@
@@ -12,10 +12,12 @@ from wagtail.admin.edit_handlers import FieldPanel, StreamFieldPanel
 from stream_django.feed_manager import feed_manager
 from stream_django.enrich import Enrich
 
-from projects.models import Project
+from horodeya.page_cache import CachedPageMixin
+from projects.models import Project, load_cache_versions
+from projects.pagination import get_cursor, keyset_page
 
 
-class HomePage(Page):
+class HomePage(CachedPageMixin, Page):
     body = StreamField([
         ('text', blocks.RichTextBlock()),
         ('image', ImageChooserBlock()),
@@ -37,7 +39,7 @@ class HomePage(Page):
         StreamFieldPanel('body'),
     ]
 
-    def serve(self, request):
+    def render_page(self, request):
         # user = request.user
 
         # if user.is_authenticated:
@@ -54,7 +56,7 @@ class HomePage(Page):
         })
 
 
-class AboutUs(Page):
+class AboutUs(CachedPageMixin, Page):
 
     body = StreamField([
         ('text', blocks.TextBlock()),
@@ -73,7 +75,7 @@ class AboutUs(Page):
     ]
 
 
-class List(Page):
+class List(CachedPageMixin, Page):
     body = RichTextField(blank=True)
     type = models.CharField(max_length=20, choices=Project.TYPES)
 
@@ -82,14 +84,19 @@ class List(Page):
         FieldPanel('type'),
     ]
 
-    def serve(self, request):
+    def render_page(self, request):
+        items, next_cursor = keyset_page(
+            Project.objects.with_stats().filter(verified_status='accepted').select_related('community'),
+            get_cursor(request), ordering=('-community__bal', '-id'))
+
         return render(request, 'home/list.html', {
             'page': self,
-            'items': Project.objects.filter(verified_status='accepted').order_by('-community__bal'),
+            'items': load_cache_versions(items),
+            'next_cursor': next_cursor,
         })
 
 
-class TermsAndConditions(Page):
+class TermsAndConditions(CachedPageMixin, Page):
     body = RichTextField(blank=True)
 
     content_panels = Page.content_panels + [
@@ -97,7 +104,7 @@ class TermsAndConditions(Page):
     ]
 
 
-class LearnMore(Page):
+class LearnMore(CachedPageMixin, Page):
     body = RichTextField(blank=True)
 
     content_panels = Page.content_panels + [
@@ -2,10 +2,9 @@ from django.shortcuts import render, get_object_or_404
 from django.views.generic.edit import UpdateView
 from projects.models import User
 from django.http import JsonResponse
-from projects.models import Project
+from projects.models import Project, with_user_counts
 
-from stream_django.feed_manager import feed_manager
-from stream_django.enrich import Enrich
+from projects.feeds import get_feed_backend
 
 
 # Create your views here.
@@ -18,29 +17,18 @@ from stream_django.enrich import Enrich
 
 
 def account(request, pk=None):
-    if pk:
-        account = get_object_or_404(User, pk=pk)
-    else:
-        account = request.user
+    account = get_object_or_404(
+        with_user_counts(User.objects.all()), pk=pk or request.user.pk)
 
-    projectsSet = []
-
-    for project in Project.objects.filter(verified_status='accepted'):
-        for community in account.communities.all():
-            if project.community_id == community.pk:
-                projectsSet.append(project)
-
-    account.projects = projectsSet
+    account.projects = Project.objects.filter(
+        verified_status='accepted',
+        community__in=account.communities.all()).select_related('community')
     return render(request, 'home/account.html', {'object': account})
 
 
 def notifications(request):
     user = request.user
 
-    notification_feed = feed_manager.get_notification_feed(user.id)
-    notification_stats = notification_feed.get(limit=10, mark_seen=True)
-    enricher = Enrich()
-    notifications = enricher.enrich_aggregated_activities(
-        notification_stats['results'])
+    notifications = get_feed_backend().notifications(user.id, limit=10)
 
     return render(request, 'activity/aggregated/report.html', {'notifications': notifications})
@@ -1,10 +1,77 @@
-from stream_django.feed_manager import feed_manager
+from django.contrib.auth.signals import user_logged_out
+from django.core.cache import cache
+from django.dispatch import receiver
+from django.utils.functional import SimpleLazyObject
+
+from projects.feeds import StreamFeedBackend, get_feed_backend
+
+STREAM_TOKEN_TTL = 24 * 60 * 60
+
+# How many renders used the token and how many of them had to generate it
+STREAM_TOKEN_RENDERS = 'stream-token-renders'
+STREAM_TOKEN_MISSES = 'stream-token-misses'
+
+
+def stream_token_key(user_id):
+    return 'stream-token-%d' % user_id
+
+
+def count(key):
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # evicted between add and incr
+        pass
+
+
+def stream_token_stats():
+    return {
+        'renders': cache.get(STREAM_TOKEN_RENDERS, 0),
+        'misses': cache.get(STREAM_TOKEN_MISSES, 0),
+    }
+
+
+def get_stream_token(user):
+    if not user.is_authenticated:
+        return None
+
+    count(STREAM_TOKEN_RENDERS)
+
+    key = stream_token_key(user.id)
+    token = cache.get(key)
+    if token is None:
+        from stream_django.feed_manager import feed_manager
+
+        count(STREAM_TOKEN_MISSES)
+        token = feed_manager.get_notification_feed(
+            user.id).get_readonly_token()
+        cache.set(key, token, STREAM_TOKEN_TTL)
+
+    return token
+
 
 def stream_token(request):
+    if not isinstance(get_feed_backend(), StreamFeedBackend):
+        return {}
+
+    # only generated when a template actually renders it
+    return {
+        'stream_feeds': True,
+        'stream_token': SimpleLazyObject(lambda: get_stream_token(request.user)),
+    }
+
+
+def notifications_unseen(request):
+    backend = get_feed_backend()
+    if isinstance(backend, StreamFeedBackend) or not request.user.is_authenticated:
+        return {}
+
+    # the Stream client counts by itself, local feeds are counted when rendered
+    return {'notifications_unseen': SimpleLazyObject(lambda: backend.unseen_count(request.user.id))}
 
-    if request.user.is_authenticated:
-        stream_token = feed_manager.get_notification_feed(request.user.id).get_readonly_token()
-    else:
-        stream_token = None
 
-    return {'stream_token': stream_token}
+@receiver(user_logged_out)
+def forget_stream_token(sender, request, user, **kwargs):
+    if user is not None:
+        cache.delete(stream_token_key(user.id))
@@ -0,0 +1,132 @@
+import hashlib
+import re
+import time
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from django.utils.translation import get_language
+
+from wagtail.core.signals import page_published, page_unpublished
+
+# Bumped when a Wagtail page is published and when any project changes
+PAGES_VERSION_KEY = 'pages-version'
+
+CSRF_INPUT = re.compile(rb'(name="csrfmiddlewaretoken" value=")[^"]*(")')
+
+
+def new_version():
+    # Milliseconds, so the version also tells when the data last changed and
+    # a version which was evicted never matches pages cached before that
+    return int(time.time() * 1000)
+
+
+def get_versions(keys):
+    versions = cache.get_many(keys)
+    missing = {key: new_version() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+
+    return [versions[key] for key in keys]
+
+
+def bump_versions(keys):
+    """Makes everything cached under these version keys stale"""
+    current = cache.get_many(keys)
+    cache.set_many({
+        key: max(new_version(), current.get(key, 0) + 1) for key in keys
+    }, None)
+
+
+def cacheable(request):
+    return (settings.PAGE_CACHE_TIMEOUT and request.method in ('GET', 'HEAD')
+            and not request.user.is_authenticated and not len(get_messages(request)))
+
+
+def cached_page(request, version_keys, render, last_modified=None):
+    """
+    Serves the page to anonymous visitors from the cache.
+
+    The page is cached per path and language under the current values of
+    `version_keys`, bumping any of them purges it. `render` builds the
+    response on a miss, after which `last_modified` is called for the
+    updated_at of the shown object. Logged in visitors always get `render()`.
+    """
+    if not cacheable(request):
+        return render()
+
+    versions = get_versions(version_keys)
+    key = hashlib.md5(('%s:%s:%s' % (
+        versions, get_language(), request.get_full_path())).encode()).hexdigest()
+    etag = quote_etag(key)
+
+    entry = cache.get('page-' + key)
+    response = None
+    if entry is None:
+        response = render()
+        if hasattr(response, 'render') and not response.is_rendered:
+            response.render()
+
+        # Pages showing a message, like a failed feed request, are not cached
+        if response.status_code != 200 or response.streaming or len(get_messages(request)):
+            return response
+
+        modified = max(versions) / 1000
+        updated_at = last_modified() if last_modified else None
+        if updated_at:
+            modified = max(modified, updated_at.timestamp())
+
+        entry = {
+            'content': response.content,
+            'content_type': response['Content-Type'],
+            'last_modified': int(modified),
+        }
+        cache.set('page-' + key, entry, settings.PAGE_CACHE_TIMEOUT)
+
+    not_modified = get_conditional_response(
+        request, etag=etag, last_modified=entry['last_modified'])
+
+    if not_modified is not None:
+        response = not_modified
+    elif response is None:
+        # The cached page holds the CSRF token of the visitor it was rendered for
+        content = CSRF_INPUT.sub(
+            lambda match: match.group(1) + get_token(request).encode() + match.group(2),
+            entry['content'])
+        response = HttpResponse(content, content_type=entry['content_type'])
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(entry['last_modified'])
+    patch_cache_control(response, no_cache=True)
+    patch_vary_headers(response, ['Cookie'])
+    return response
+
+
+class CachedPageMixin:
+    """
+    Serves a Wagtail page to anonymous visitors from the page cache.
+
+    Pages with their own view override render_page instead of serve.
+    """
+
+    def render_page(self, request, *args, **kwargs):
+        return super().serve(request, *args, **kwargs)
+
+    def serve(self, request, *args, **kwargs):
+        return cached_page(
+            request, [PAGES_VERSION_KEY],
+            lambda: self.render_page(request, *args, **kwargs),
+            last_modified=lambda: self.last_published_at)
+
+
+def purge_pages(**kwargs):
+    bump_versions([PAGES_VERSION_KEY])
+
+
+page_published.connect(purge_pages, dispatch_uid='page_cache_published')
+page_unpublished.connect(purge_pages, dispatch_uid='page_cache_unpublished')
@@ -42,7 +42,7 @@ else:
     SECRET_KEY = os.getenv('SECRET_KEY')
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = os.getenv('DEBUG', 'True') == 'True'
 
 ALLOWED_HOSTS = ['0.0.0.0', 'localhost',
                  '127.0.0.1', '.horodeya.com', 'horodeya.com']
@@ -68,6 +68,7 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'django_countries',
+    'rest_framework',
 
     # allauth
     'django.contrib.sites',
@@ -106,6 +107,7 @@ if not TEST:
 
 
 MIDDLEWARE = [
+    'horodeya.timing_middleware.RequestTimingMiddleware',
     'debug_toolbar.middleware.DebugToolbarMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -136,6 +138,7 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 'horodeya.context_processors.stream_token',
+                'horodeya.context_processors.notifications_unseen',
             ],
         },
     },
@@ -251,6 +254,58 @@ INTERNAL_IPS = [
     '127.0.0.1',
 ]
 
+# Community-wide notifications are queued for the send_notifications worker
+NOTIFICATIONS_SYNC = TEST
+
+# Uploaded photos are downscaled to fit this many pixels on their longer side
+PHOTO_MAX_SIZE = 2048
+
+# Photo sizes are generated by the generate_photo_sizes worker
+PHOTO_SIZES_SYNC = TEST
+
+# Number of rows on a page of the list views and feeds
+PAGE_SIZE = 25
+
+# Share of the requests measured by RequestTimingMiddleware, 0 turns it off
+REQUEST_TIMING_SAMPLE_RATE = float(
+    os.getenv('REQUEST_TIMING_SAMPLE_RATE', '0' if TEST else '0.05'))
+# Staff always get the Server-Timing header of sampled requests, this sends it to everybody
+REQUEST_TIMING_HEADER = os.getenv('REQUEST_TIMING_HEADER', str(DEBUG)) == 'True'
+
+# The uwsgi processes and the cron commands share memcached, so a bump in one of them reaches all
+if os.getenv('MEMCACHED_LOCATION'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
+            'LOCATION': os.getenv('MEMCACHED_LOCATION'),
+        }
+    }
+
+# Seconds a page is served from the cache to anonymous visitors, 0 turns it off
+PAGE_CACHE_TIMEOUT = int(os.getenv('PAGE_CACHE_TIMEOUT', '0' if TEST else '3600'))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'horodeya.timing': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
+# Where project timelines are stored, LocalFeedBackend or StreamFeedBackend.
+# The follows of the users are kept in Stream, run import_stream_follows
+# before switching an existing site to FEED_BACKEND=projects.feeds.LocalFeedBackend
+FEED_BACKEND = os.getenv('FEED_BACKEND', 'projects.feeds.LocalFeedBackend' if TEST else 'projects.feeds.StreamFeedBackend')
+
 STREAM_API_KEY = os.getenv('STREAM_API_KEY')
 STREAM_API_SECRET = os.getenv('STREAM_API_SECRET')
 
@@ -274,6 +329,13 @@ def PHOTOLOGUE_PATH(instance, filename):
 AWS_ACCESS_KEY_ID = os.getenv('AWS_ACCESS_KEY_ID')
 AWS_SECRET_ACCESS_KEY = os.getenv('AWS_SECRET_ACCESS_KEY')
 AWS_DEFAULT_REGION = os.getenv('AWS_DEFAULT_REGION')
+# A local S3 stand-in like MinIO, e.g. http://localhost:9000
+AWS_S3_ENDPOINT_URL = os.getenv('AWS_S3_ENDPOINT_URL')
+
+# Photos are uploaded by the browser straight to the bucket, see projects/uploads.py
+DIRECT_UPLOADS = os.getenv('DIRECT_UPLOADS', 'False') == 'True'
+PHOTO_UPLOAD_MAX_BYTES = 20 * 1024 * 1024
+PHOTO_UPLOAD_TYPES = ['image/jpeg', 'image/png', 'image/webp', 'image/gif']
 
 STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 if TEST or DEV:
@@ -307,6 +369,10 @@ else:
 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+if DEV and AWS_S3_ENDPOINT_URL:
+    # Media on the local S3 stand-in, to try the direct uploads
+    DEFAULT_FILE_STORAGE = 'horodeya.storage_backends.MediaStorage'
+
 if TEST:
     MEDIA_URL = '/media/'
 else:
@@ -0,0 +1,140 @@
+import json
+import logging
+import random
+import threading
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.template.backends.django import Template
+from urllib3.connectionpool import HTTPConnectionPool
+
+logger = logging.getLogger('horodeya.timing')
+
+_local = threading.local()
+
+# Outbound services recognized by the host name, everything else is "http"
+SERVICES = [
+    ('stream', ('stream-io-api.com', 'getstream.io')),
+    ('sendgrid', ('sendgrid.com', 'sendgrid.net')),
+    ('s3', ('amazonaws.com',)),
+]
+
+
+def service_name(host):
+    for name, suffixes in SERVICES:
+        if host and host.endswith(suffixes):
+            return name
+
+    return 'http'
+
+
+def add_timing(name, started):
+    _local.timings[name] = _local.timings.get(name, 0) + time.perf_counter() - started
+
+
+def timed_render(render):
+    def wrapper(self, *args, **kwargs):
+        if getattr(_local, 'timings', None) is None or _local.rendering:
+            return render(self, *args, **kwargs)
+
+        # Included templates are rendered inside the outer one, time it once
+        _local.rendering = True
+        started = time.perf_counter()
+        try:
+            return render(self, *args, **kwargs)
+        finally:
+            _local.rendering = False
+            add_timing('template', started)
+
+    return wrapper
+
+
+def timed_urlopen(urlopen):
+    def wrapper(self, *args, **kwargs):
+        if getattr(_local, 'timings', None) is None or _local.requesting:
+            return urlopen(self, *args, **kwargs)
+
+        # urllib3 calls urlopen again on retries and redirects
+        _local.requesting = True
+        started = time.perf_counter()
+        try:
+            return urlopen(self, *args, **kwargs)
+        finally:
+            _local.requesting = False
+            add_timing(service_name(self.host), started)
+
+    return wrapper
+
+
+def time_query(execute, sql, params, many, context):
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        _local.queries += 1
+        add_timing('db', started)
+
+
+class RequestTimingMiddleware:
+    """
+    Measures a sample of the requests: the number and time of the SQL queries,
+    the template rendering and the calls to Stream, SendGrid and S3.
+
+    The figures are logged as JSON on the horodeya.timing logger and sent back
+    to staff in a Server-Timing header, so they show up in the browser developer
+    tools. REQUEST_TIMING_HEADER sends the header to everybody.
+    Requests outside the sample pay a single random() call.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+        if not getattr(Template.render, 'timed', False):
+            Template.render = timed_render(Template.render)
+            Template.render.timed = True
+            HTTPConnectionPool.urlopen = timed_urlopen(HTTPConnectionPool.urlopen)
+
+    def __call__(self, request):
+        if random.random() >= settings.REQUEST_TIMING_SAMPLE_RATE:
+            return self.get_response(request)
+
+        _local.timings = {}
+        _local.queries = 0
+        _local.rendering = False
+        _local.requesting = False
+        started = time.perf_counter()
+
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(time_query))
+                response = self.get_response(request)
+
+            timings = _local.timings
+            timings['total'] = time.perf_counter() - started
+            queries = _local.queries
+        finally:
+            _local.timings = None
+
+        match = request.resolver_match
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'url_name': match.view_name if match else None,
+            'status': response.status_code,
+            'queries': queries,
+        }
+        record.update(('%s_ms' % name, round(seconds * 1000, 2))
+                      for name, seconds in timings.items())
+        logger.info(json.dumps(record, sort_keys=True))
+
+        user = getattr(request, 'user', None)
+        if settings.REQUEST_TIMING_HEADER or (user is not None and user.is_staff):
+            response['Server-Timing'] = ', '.join(
+                '%s;dur=%.2f' % (name, seconds * 1000) if name != 'db' else
+                'db;dur=%.2f;desc="%d queries"' % (seconds * 1000, queries)
+                for name, seconds in sorted(timings.items()))
+
+        return response
@@ -23,6 +23,7 @@ from wagtail.documents import urls as wagtaildocs_urls
 from wagtail.core import urls as wagtail_urls
 
 from home import views as home_views
+from projects.api import router as api_router
 
 import notifications.urls
 from django.conf.urls import url
@@ -36,6 +37,7 @@ urlpatterns = [
     path('accounts/profile/<int:pk>', home_views.account, name='account'),
     path('accounts/', include('allauth.urls')),
     path('projects/', include('projects.urls')),
+    path('api/v1/', include((api_router.urls, 'api'))),
     path('admin/', admin.site.urls),
     re_path(r'^photologue/', include('photologue.urls', namespace='photologue')),
     re_path(r'^cms/', include(wagtailadmin_urls)),
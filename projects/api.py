@@ -0,0 +1,136 @@
+from collections import OrderedDict
+
+from django.utils.cache import get_conditional_response, set_response_etag
+
+from rest_framework import routers, viewsets
+from rest_framework.pagination import BasePagination
+from rest_framework.permissions import AllowAny
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from projects.models import Community, Project, ThingNecessity, TimeNecessity, MoneySupport, TimeSupport, Support
+from projects.pagination import get_cursor, keyset_page
+from projects.serializers import STATS_FIELDS, requested_fields, CommunitySerializer, ProjectSerializer, ThingNecessitySerializer, TimeNecessitySerializer, MoneySupportSerializer, TimeSupportSerializer
+
+PUBLIC_SUPPORT_STATUSES = [Support.STATUS.accepted, Support.STATUS.delivered]
+
+
+class KeysetCursorPagination(BasePagination):
+    """Pages with keyset_page, the next page is linked with ?before= like on the site"""
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page, self.next_cursor = keyset_page(
+            queryset, get_cursor(request), view.keyset_ordering)
+        return page
+
+    def get_paginated_response(self, data):
+        next_url = None
+        if self.next_cursor:
+            next_url = replace_query_param(
+                self.request.build_absolute_uri(), 'before', self.next_cursor)
+
+        return Response(OrderedDict([
+            ('next', next_url),
+            ('results', data),
+        ]))
+
+
+def get_id_param(request, name):
+    value = request.query_params.get(name, '')
+    return int(value) if value.isdigit() else None
+
+
+class ReadOnlyViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Public read-only endpoint, it does not look at the session.
+
+    Answers GET requests with an ETag of the content, so clients which send
+    it back in If-None-Match get an empty 304 when nothing changed.
+    """
+    authentication_classes = []
+    permission_classes = [AllowAny]
+    renderer_classes = [JSONRenderer]
+    pagination_class = KeysetCursorPagination
+    keyset_ordering = ('-id',)
+    # Filters the list by the id of a related object, e.g. ?project=1
+    filter_params = []
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+
+        for name in self.filter_params:
+            value = get_id_param(self.request, name)
+            if value is not None:
+                queryset = queryset.filter(**{name: value})
+
+        return queryset
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+
+        if request.method in ('GET', 'HEAD') and response.status_code == 200:
+            response.render()
+            set_response_etag(response)
+            return get_conditional_response(request, etag=response['ETag'], response=response)
+
+        return response
+
+
+class CommunityViewSet(ReadOnlyViewSet):
+    queryset = Community.objects.all()
+    serializer_class = CommunitySerializer
+    keyset_ordering = ('-created_at', '-id')
+
+
+class ProjectViewSet(ReadOnlyViewSet):
+    queryset = Project.objects.filter(verified_status='accepted').select_related('community')
+    serializer_class = ProjectSerializer
+    keyset_ordering = ('-created_at', '-id')
+    filter_params = ['community']
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+
+        # The stats subqueries are the expensive part, skip them when not asked for
+        fields = requested_fields(self.request)
+        if fields is None or fields.intersection(STATS_FIELDS):
+            queryset = queryset.with_stats()
+
+        return queryset
+
+
+class ThingNecessityViewSet(ReadOnlyViewSet):
+    queryset = ThingNecessity.objects.filter(project__verified_status='accepted')
+    serializer_class = ThingNecessitySerializer
+    filter_params = ['project']
+
+
+class TimeNecessityViewSet(ReadOnlyViewSet):
+    queryset = TimeNecessity.objects.filter(project__verified_status='accepted')
+    serializer_class = TimeNecessitySerializer
+    filter_params = ['project']
+
+
+class MoneySupportViewSet(ReadOnlyViewSet):
+    queryset = MoneySupport.objects.filter(
+        project__verified_status='accepted', status__in=PUBLIC_SUPPORT_STATUSES).select_related('user')
+    serializer_class = MoneySupportSerializer
+    filter_params = ['project', 'necessity']
+
+
+class TimeSupportViewSet(ReadOnlyViewSet):
+    queryset = TimeSupport.objects.filter(
+        project__verified_status='accepted', status__in=PUBLIC_SUPPORT_STATUSES).select_related('user')
+    serializer_class = TimeSupportSerializer
+    filter_params = ['project', 'necessity']
+
+
+router = routers.DefaultRouter()
+router.register('communities', CommunityViewSet, basename='community')
+router.register('projects', ProjectViewSet, basename='project')
+router.register('thing-necessities', ThingNecessityViewSet, basename='thingnecessity')
+router.register('time-necessities', TimeNecessityViewSet, basename='timenecessity')
+router.register('money-supports', MoneySupportViewSet, basename='moneysupport')
+router.register('time-supports', TimeSupportViewSet, basename='timesupport')
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class ProjectsConfig(AppConfig):
     name = 'projects'
+
+    def ready(self):
+        import projects.signals  # noqa: F401
+        import horodeya.context_processors  # noqa: F401
@@ -0,0 +1,165 @@
+import itertools
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+from requests.exceptions import Timeout, ConnectionError
+
+from projects.models import FeedFollow, FeedActivity, TimelineEntry
+
+# Followers see this many of the latest project activities right away
+BACKFILL = 100
+BATCH_SIZE = 500
+
+
+class AggregatedActivity:
+    def __init__(self, activities, is_seen):
+        self.activities = activities
+        self.activity_count = len(activities)
+        self.is_seen = is_seen
+
+
+class LocalFeedBackend:
+    """Activity feeds stored in our own tables, fanned out on write"""
+
+    def follow_project(self, user_id, project):
+        with transaction.atomic():
+            FeedFollow.objects.get_or_create(
+                follower_id=user_id, project=project)
+
+            activity_ids = FeedActivity.objects.filter(project=project).order_by(
+                '-id').values_list('pk', flat=True)[:BACKFILL]
+            TimelineEntry.objects.bulk_create([
+                TimelineEntry(follower_id=user_id, activity_id=activity_id)
+                for activity_id in activity_ids
+            ], ignore_conflicts=True)
+
+    def add_activity(self, instance):
+        with transaction.atomic():
+            activity = FeedActivity.objects.create(
+                project_id=instance.project_id,
+                verb=instance.__class__.__name__.lower(),
+                time=instance.created_at,
+                **{instance.__class__.__name__.lower(): instance}
+            )
+
+            follower_ids = FeedFollow.objects.filter(
+                project_id=instance.project_id).values_list('follower_id', flat=True)
+            TimelineEntry.objects.bulk_create([
+                TimelineEntry(follower_id=follower_id, activity=activity)
+                for follower_id in follower_ids
+            ], batch_size=BATCH_SIZE)
+
+        return activity
+
+    def project_timeline(self, project, limit=25, before=None):
+        activities = FeedActivity.objects.filter(project=project)
+        if before:
+            activities = activities.filter(pk__lt=before)
+
+        activities = list(activities.select_related(
+            'project__community', 'announcement', 'report').order_by('-id')[:limit])
+
+        return activities, self.next_cursor(activities, limit)
+
+    def user_timeline(self, user_id, limit=25, before=None):
+        entries = self.entries(user_id)
+        if before:
+            entries = entries.filter(activity_id__lt=before)
+
+        activities = [entry.activity for entry in entries[:limit]]
+
+        return activities, self.next_cursor(activities, limit)
+
+    def notifications(self, user_id, limit=10):
+        """The latest activities grouped by project, verb and day, marked as seen"""
+        entries = list(self.entries(user_id)[:limit * 10])
+
+        def group_key(entry):
+            activity = entry.activity
+            return activity.project_id, activity.verb, activity.time.date()
+
+        groups = []
+        for key, group in itertools.groupby(entries, group_key):
+            group = list(group)
+            groups.append(AggregatedActivity(
+                [entry.activity for entry in group],
+                all(entry.seen for entry in group)))
+            if len(groups) == limit:
+                break
+
+        TimelineEntry.objects.filter(pk__in=[
+            entry.pk for entry in entries if not entry.seen]).update(seen=True)
+
+        return groups
+
+    def unseen_count(self, user_id):
+        return TimelineEntry.objects.filter(follower_id=user_id, seen=False).count()
+
+    def entries(self, user_id):
+        return TimelineEntry.objects.filter(follower_id=user_id).select_related(
+            'activity__project__community', 'activity__announcement', 'activity__report').order_by('-activity_id')
+
+    def next_cursor(self, activities, limit):
+        if len(activities) < limit:
+            return None
+
+        return activities[-1].pk
+
+
+class StreamFeedBackend:
+    """Activity feeds hosted by getstream.io"""
+
+    def follow_project(self, user_id, project):
+        from stream_django.feed_manager import feed_manager
+
+        news_feeds = feed_manager.get_news_feeds(user_id)
+
+        for feed in news_feeds.values():
+            feed.follow('project', project.id)
+
+        notification_feed = feed_manager.get_notification_feed(user_id)
+        notification_feed.follow('project', project.id)
+
+    def add_activity(self, instance):
+        # stream_django adds the activities of tracked models by itself
+        pass
+
+    def project_timeline(self, project, limit=25, before=None):
+        from stream_django.feed_manager import feed_manager
+
+        return self.enriched(feed_manager.get_feed('project', project.id), limit, before)
+
+    def user_timeline(self, user_id, limit=25, before=None):
+        from stream_django.feed_manager import feed_manager
+
+        return self.enriched(feed_manager.get_feed('timeline', user_id), limit, before)
+
+    def notifications(self, user_id, limit=10):
+        from stream_django.feed_manager import feed_manager
+        from stream_django.enrich import Enrich
+
+        notification_feed = feed_manager.get_notification_feed(user_id)
+        notification_stats = notification_feed.get(limit=limit, mark_seen=True)
+
+        return Enrich().enrich_aggregated_activities(notification_stats['results'])
+
+    def enriched(self, feed, limit, before):
+        from stream_django.enrich import Enrich
+
+        kwargs = {'limit': limit}
+        if before:
+            kwargs['id_lt'] = before
+
+        try:
+            activities = Enrich().enrich_activities(feed.get(**kwargs)['results'])
+        except (Timeout, ConnectionError):
+            return None, None
+
+        next_cursor = activities[-1]['id'] if len(activities) == limit else None
+        return activities, next_cursor
+
+
+def get_feed_backend():
+    return import_string(settings.FEED_BACKEND)()
@@ -8,8 +8,8 @@ from projects.models import Project, Community, Question, BugReport, EpayMoneySu
 from django.core.exceptions import ValidationError
 
 
-def question_key(question):
-    return 'question_%d' % question.pk
+def question_key(question_id):
+    return 'question_%d' % question_id
 
 
 class QuestionForm(forms.Form):
@@ -23,13 +23,13 @@ class QuestionForm(forms.Form):
 
         self.answer_values = {}
         for answer in answers:
-            self.answer_values[question_key(answer.question)] = answer.answer
+            self.answer_values[question_key(answer.question_id)] = answer.answer
 
         self.questions = {}
 
         for question in questions:
             label = getattr(question.prototype, 'text_%s' % get_language())
-            key = question_key(question)
+            key = question_key(question.pk)
             if question.prototype.type == 'Necessities':
                 self.fields['necessities'] = forms.CharField(
                     label=label, required=False)
@@ -54,16 +54,13 @@ class QuestionForm(forms.Form):
             self.questions[key] = question
 
     def save(self, project):
-        for question in self.fields.keys():
-            if 'question' in question:
-                value = self.cleaned_data[question]
-
-                if value is None:
-                    value = ''
-                answer, created = Answer.objects.update_or_create(
-                    project=project,
-                    question=self.questions[question],
-                    defaults={'answer': value})
+        values = {}
+        for key, question in self.questions.items():
+            if key in self.fields:
+                value = self.cleaned_data[key]
+                values[question.pk] = '' if value is None else value
+
+        Answer.save_answers(project.pk, values)
 
 
 class PaymentForm(forms.Form):
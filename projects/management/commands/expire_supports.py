@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from projects.models import Project, ProjectStats, Support, MoneySupport, TimeSupport, SUPPORT_DELIVERY_PERIOD
+from projects.notifier import build_notification, bulk_notify
+from projects.signals import bump_after_commit
+
+
+class Command(BaseCommand):
+    help = 'Marks accepted supports which were not delivered in time as expired'
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        expired = []
+
+        with transaction.atomic():
+            for model in [MoneySupport, TimeSupport]:
+                queryset = model.objects.select_for_update().filter(
+                    status=Support.STATUS.accepted,
+                    status_since__lt=now - SUPPORT_DELIVERY_PERIOD)
+
+                expired.extend(queryset.values_list('user_id', 'project_id'))
+                queryset.update(status=Support.STATUS.expired,
+                                status_since=now, updated_at=now)
+
+            projects = Project.objects.in_bulk(
+                set(project_id for user_id, project_id in expired))
+
+            for project_id in projects:
+                ProjectStats.refresh(project_id)
+
+            # update() sends no post_save, the cached fragments and pages are bumped here
+            bump_after_commit(list(projects))
+
+            bulk_notify([
+                build_notification(
+                    projects[project_id], user_id,
+                    'Срокът на вашата подкрепа към %s изтече' % projects[project_id].name,
+                    timestamp=now)
+                for user_id, project_id in expired
+            ])
+
+        self.stdout.write(self.style.SUCCESS(
+            'Expired %d supports' % len(expired)))
@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from projects.photos import generate_queued
+
+
+class Command(BaseCommand):
+    help = 'Generates the photo sizes of the queued uploads'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep polling the queue instead of exiting once it is empty')
+        parser.add_argument('--interval', type=float, default=5,
+                            help='Seconds to wait between polls when looping')
+
+    def handle(self, *args, **options):
+        total = 0
+
+        while True:
+            generated = generate_queued()
+            total += generated
+
+            if generated:
+                continue
+
+            if not options['loop']:
+                break
+
+            time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(
+            'Generated the sizes of %d photos' % total))
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from projects.feeds import LocalFeedBackend
+from projects.models import Project, User
+
+PAGE = 100
+
+
+class Command(BaseCommand):
+    help = 'Copies the projects every user follows on Stream to the local feeds'
+
+    def handle(self, *args, **options):
+        from stream_django.feed_manager import feed_manager
+
+        backend = LocalFeedBackend()
+        projects = Project.objects.in_bulk()
+        count = 0
+
+        for user_id in User.objects.values_list('pk', flat=True).iterator():
+            # follow_project makes the notification feed follow the project too
+            feed = feed_manager.get_notification_feed(user_id)
+
+            offset = 0
+            while True:
+                follows = feed.following(offset=offset, limit=PAGE)['results']
+                for follow in follows:
+                    feed_slug, feed_id = follow['target_id'].split(':')
+                    project = projects.get(int(feed_id)) if feed_slug == 'project' else None
+                    if project is not None:
+                        backend.follow_project(user_id, project)
+                        count += 1
+
+                if len(follows) < PAGE:
+                    break
+                offset += PAGE
+
+        self.stdout.write(self.style.SUCCESS(
+            'Imported %d follows' % count))
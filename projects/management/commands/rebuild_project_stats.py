@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from projects.models import Project, ProjectStats
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the denormalized stats of every project from scratch'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            ProjectStats.objects.all().delete()
+
+            count = 0
+            for project_id in Project.objects.values_list('pk', flat=True).iterator():
+                ProjectStats.refresh(project_id)
+                count += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            'Rebuilt stats for %d projects' % count))
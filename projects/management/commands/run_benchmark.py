@@ -0,0 +1,125 @@
+import json
+import math
+import time
+from unittest import mock
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from home.models import List
+from projects.models import User, Project, ThingNecessity, MoneySupport, Support
+
+from .seed_benchmark import PREFIX
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    index = max(0, math.ceil(len(values) * percent / 100) - 1)
+    return round(values[index], 2)
+
+
+class Command(BaseCommand):
+    help = 'Times the main pages and the money matching on the seed_benchmark data and prints JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=20,
+                            help='How many times each endpoint is called')
+        parser.add_argument('--output', help='Write the results to this file instead of stdout')
+
+    def measure(self, runs, call, prepare=None):
+        if runs == 0:
+            return {'skipped': 'no seeded data to run on'}
+
+        timings = []
+        queries = []
+
+        for i in range(runs):
+            if prepare:
+                prepare(i)
+
+            with CaptureQueriesContext(connection) as context:
+                start = time.perf_counter()
+                call(i)
+                timings.append((time.perf_counter() - start) * 1000)
+            queries.append(len(context.captured_queries))
+
+        return {
+            'runs': runs,
+            'p50_ms': percentile(timings, 50),
+            'p95_ms': percentile(timings, 95),
+            'queries': percentile(queries, 50),
+            'max_queries': max(queries),
+        }
+
+    def get(self, client, url, status=200):
+        response = client.get(url)
+        if response.status_code != status:
+            raise CommandError('%s returned %d' % (url, response.status_code))
+        if status == 302 and response.url.startswith(settings.LOGIN_URL):
+            raise CommandError('%s is not permitted' % url)
+
+    def handle(self, *args, **options):
+        project = Project.objects.filter(
+            name__startswith=PREFIX + ' ', verified_status='accepted').order_by('pk').first()
+        if project is None:
+            raise CommandError('Run seed_benchmark first')
+
+        member = User.objects.filter(communities=project.community_id).order_by('pk').first()
+        runs = options['runs']
+        client = Client()
+        client.force_login(member)
+        results = {}
+
+        # The Stream token is an external call, it is not what is measured here
+        with override_settings(ALLOWED_HOSTS=['testserver']), \
+                mock.patch('horodeya.context_processors.get_stream_token', return_value=''), \
+                transaction.atomic():
+
+            results['project_details'] = self.measure(runs, lambda i: self.get(
+                client, reverse('projects:details', args=[project.pk])))
+
+            results['community_details'] = self.measure(runs, lambda i: self.get(
+                client, reverse('projects:community_details', args=[project.community_id])))
+
+            results['account'] = self.measure(runs, lambda i: self.get(
+                client, reverse('account', args=[member.pk])))
+
+            results['user_vote_list'] = self.measure(runs, lambda i: self.get(
+                client, reverse('projects:user_vote_list', args=[member.pk])))
+
+            page = List.objects.live().first()
+            if page is not None and page.url:
+                results['list'] = self.measure(runs, lambda i: self.get(client, page.url))
+            else:
+                results['list'] = {'skipped': 'no live List page'}
+
+            supports = list(MoneySupport.objects.filter(
+                project__name__startswith=PREFIX + ' ', status=Support.STATUS.review,
+                necessity__isnull=False).select_related('project').order_by('pk')[:runs])
+
+            # Only superusers hold the accept_support permission
+            client.force_login(User.objects.create(
+                username=PREFIX + '-superuser', is_superuser=True))
+
+            results['support_change_accept'] = self.measure(len(supports), lambda i: self.get(
+                client, reverse('projects:support_accept', args=[supports[i].pk, 'money']), status=302))
+
+            necessities = list(ThingNecessity.objects.filter(
+                project__name__startswith=PREFIX + ' ').order_by('pk')[:runs])
+
+            results['money_matching'] = self.measure(len(necessities), lambda i: (
+                necessities[i].create_thing_support_from_unused_money_support()))
+
+            # Accepting supports changes the data, roll back so runs can be compared
+            transaction.set_rollback(True)
+
+        report = json.dumps(results, indent=2, sort_keys=True)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                output.write(report)
+        else:
+            self.stdout.write(report)
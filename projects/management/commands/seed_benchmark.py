@@ -0,0 +1,149 @@
+import random
+from datetime import timedelta
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from vote.models import Vote, UP
+
+from projects.models import User, Community, Project, ThingNecessity, TimeNecessity, MoneySupport, TimeSupport, Report, FeedActivity, Support
+from projects.notifier import build_notification, bulk_notify
+
+PREFIX = 'bench'
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = 'Fills the database with synthetic communities, projects and supports for run_benchmark'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--communities', type=int, default=2000)
+        parser.add_argument('--projects-per-community', type=int, default=10)
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--supports-per-project', type=int, default=4)
+        parser.add_argument('--reports-per-project', type=int, default=2)
+        parser.add_argument('--votes-per-report', type=int, default=3)
+        parser.add_argument('--notifications-per-user', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Seed of the random generator, the same seed gives the same data')
+
+    def create(self, model, objects, **lookup):
+        """Bulk creates the objects and returns their pks in creation order"""
+        model.objects.bulk_create(objects, batch_size=BATCH_SIZE)
+        return list(model.objects.filter(**lookup).order_by('pk').values_list('pk', flat=True))
+
+    def handle(self, *args, **options):
+        if User.objects.filter(username__startswith=PREFIX + '-').exists():
+            raise CommandError('Benchmark data is already seeded')
+
+        rng = random.Random(options['seed'])
+        now = timezone.now()
+        today = now.date()
+        timestamps = {'created_at': now, 'updated_at': now}
+
+        with transaction.atomic():
+            user_ids = self.create(User, [
+                User(username='%s-%d' % (PREFIX, i), password='!',
+                     first_name='Bench', last_name=str(i), date_joined=now)
+                for i in range(options['users'])
+            ], username__startswith=PREFIX + '-')
+
+            admin_ids = [rng.choice(user_ids) for i in range(options['communities'])]
+            community_ids = self.create(Community, [
+                Community(name='%s community %d' % (PREFIX, i), text='', bulstat=i,
+                          email='bench@example.com', phone=i, admin_id=admin_id,
+                          bal=rng.randint(0, 100), **timestamps)
+                for i, admin_id in enumerate(admin_ids)
+            ], name__startswith=PREFIX + ' ')
+
+            memberships = set(zip(admin_ids, community_ids))
+            for user_id in user_ids:
+                for community_id in rng.sample(community_ids, min(2, len(community_ids))):
+                    memberships.add((user_id, community_id))
+
+            Membership = User.communities.through
+            Membership.objects.bulk_create([
+                Membership(user_id=user_id, community_id=community_id)
+                for user_id, community_id in sorted(memberships)
+            ], batch_size=BATCH_SIZE)
+
+            project_ids = self.create(Project, [
+                Project(type='c', name='%s project %d %d' % (PREFIX, i, j), description='', text='',
+                        community_id=community_id, verified_status=rng.choice(['accepted'] * 9 + ['review']),
+                        **timestamps)
+                for i, community_id in enumerate(community_ids)
+                for j in range(options['projects_per_community'])
+            ], name__startswith=PREFIX + ' ')
+
+            ThingNecessity.objects.bulk_create([
+                ThingNecessity(project_id=project_id, name='%s thing' % PREFIX, description='',
+                               price=rng.randint(10, 200), count=rng.randint(1, 10), **timestamps)
+                for project_id in project_ids
+                for j in range(2)
+            ], batch_size=BATCH_SIZE)
+            things = list(ThingNecessity.objects.filter(
+                name=PREFIX + ' thing').order_by('pk').values_list('pk', 'project_id'))
+
+            time_ids = self.create(TimeNecessity, [
+                TimeNecessity(project_id=project_id, name='%s time' % PREFIX, description='',
+                              price=10, count=rng.randint(1, 10), start_date=today, end_date=today,
+                              **timestamps)
+                for project_id in project_ids
+            ], name=PREFIX + ' time')
+
+            statuses = [Support.STATUS.review, Support.STATUS.accepted, Support.STATUS.delivered]
+            MoneySupport.objects.bulk_create([
+                MoneySupport(project_id=project_id, necessity_id=necessity_id, user_id=rng.choice(user_ids),
+                             leva=rng.randint(5, 300), status=rng.choice(statuses), **timestamps)
+                for necessity_id, project_id in things
+                for j in range(options['supports_per_project'] // 2)
+            ], batch_size=BATCH_SIZE)
+
+            TimeSupport.objects.bulk_create([
+                TimeSupport(project_id=project_id, necessity_id=necessity_id, user_id=user_id,
+                            price=10, start_date=today, end_date=today, status=rng.choice(statuses),
+                            **timestamps)
+                for necessity_id, project_id in zip(time_ids, project_ids)
+                for user_id in rng.sample(user_ids, min(options['supports_per_project'] // 2, len(user_ids)))
+            ], batch_size=BATCH_SIZE)
+
+            votes = options['votes_per_report']
+            Report.objects.bulk_create([
+                Report(project_id=project_id, name='%s report' % PREFIX, text='',
+                       published_at=now - timedelta(days=j), num_vote_up=votes, vote_score=votes,
+                       **timestamps)
+                for project_id in project_ids
+                for j in range(options['reports_per_project'])
+            ], batch_size=BATCH_SIZE)
+            reports = list(Report.objects.filter(
+                name=PREFIX + ' report').order_by('pk').values_list('pk', 'project_id', 'created_at'))
+
+            FeedActivity.objects.bulk_create([
+                FeedActivity(project_id=project_id, verb='report', report_id=report_id, time=created_at)
+                for report_id, project_id, created_at in reports
+            ], batch_size=BATCH_SIZE)
+
+            report_type = ContentType.objects.get_for_model(Report)
+            Vote.objects.bulk_create([
+                Vote(user_id=user_id, content_type=report_type, object_id=report_id, action=UP)
+                for report_id, project_id, created_at in reports
+                for user_id in rng.sample(user_ids, min(votes, len(user_ids)))
+            ], batch_size=BATCH_SIZE)
+
+            actor_ids = project_ids[:100]
+            actors = Project.objects.in_bulk(actor_ids)
+            bulk_notify([
+                build_notification(actors[project_id], user_id,
+                                   'Задругата %s беше одобрена' % actors[project_id].name, timestamp=now)
+                for user_id in user_ids
+                for project_id in rng.sample(actor_ids, min(options['notifications_per_user'], len(actor_ids)))
+            ])
+
+        call_command('rebuild_project_stats', stdout=self.stdout)
+
+        self.stdout.write(self.style.SUCCESS(
+            'Seeded %d users, %d communities and %d projects' % (
+                len(user_ids), len(community_ids), len(project_ids))))
@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from projects.notifier import deliver_queued
+
+
+class Command(BaseCommand):
+    help = 'Writes the queued notifications for their recipients'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep polling the queue instead of exiting once it is empty')
+        parser.add_argument('--interval', type=float, default=5,
+                            help='Seconds to wait between polls when looping')
+
+    def handle(self, *args, **options):
+        total = 0
+
+        while True:
+            delivered = deliver_queued()
+            total += delivered
+
+            if delivered:
+                continue
+
+            if not options['loop']:
+                break
+
+            time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(
+            'Delivered %d notification jobs' % total))
@@ -0,0 +1,30 @@
+# Generated by Django 2.2.8 on 2026-10-17 11:52
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0039_merge_20200708_1927'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProjectStats',
+            fields=[
+                ('project', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='projects.Project')),
+                ('money_collected', models.FloatField(default=0)),
+                ('money_needed', models.IntegerField(default=0)),
+                ('things_needed', models.IntegerField(default=0)),
+                ('things_fulfilled', models.IntegerField(default=0)),
+                ('time_needed', models.IntegerField(default=0)),
+                ('time_fulfilled', models.IntegerField(default=0)),
+                ('money_supporters', models.IntegerField(default=0)),
+                ('time_supporters', models.IntegerField(default=0)),
+                ('supporters', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
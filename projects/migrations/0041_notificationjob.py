@@ -0,0 +1,26 @@
+# Generated by Django 2.2.8 on 2026-10-17 11:55
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('projects', '0040_projectstats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('actor_object_id', models.CharField(max_length=255)),
+                ('verb', models.CharField(max_length=255)),
+                ('recipients', models.TextField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('actor_content_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='contenttypes.ContentType')),
+            ],
+        ),
+    ]
@@ -0,0 +1,82 @@
+# Generated by Django 2.2.8 on 2026-10-17 11:57
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def import_activities(apps, schema_editor):
+    Project = apps.get_model('projects', 'Project')
+    Announcement = apps.get_model('projects', 'Announcement')
+    Report = apps.get_model('projects', 'Report')
+    FeedFollow = apps.get_model('projects', 'FeedFollow')
+    FeedActivity = apps.get_model('projects', 'FeedActivity')
+    TimelineEntry = apps.get_model('projects', 'TimelineEntry')
+
+    # Потребител 0 следва всички проекти
+    FeedFollow.objects.bulk_create([FeedFollow(follower_id=0, project_id=project_id)
+                                    for project_id in Project.objects.values_list('pk', flat=True)])
+
+    activities = [FeedActivity(project_id=a.project_id, verb='announcement', announcement=a, time=a.created_at)
+                  for a in Announcement.objects.all()]
+    activities += [FeedActivity(project_id=r.project_id, verb='report', report=r, time=r.created_at)
+                   for r in Report.objects.all()]
+
+    for activity in sorted(activities, key=lambda a: a.time):
+        activity.save()
+        TimelineEntry.objects.create(follower_id=0, activity=activity)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0041_notificationjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedActivity',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('verb', models.CharField(max_length=20)),
+                ('time', models.DateTimeField()),
+                ('announcement', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='projects.Announcement')),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='projects.Project')),
+                ('report', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='projects.Report')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TimelineEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('follower_id', models.IntegerField()),
+                ('seen', models.BooleanField(default=False)),
+                ('activity', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='projects.FeedActivity')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='FeedFollow',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('follower_id', models.IntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='projects.Project')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['follower_id', '-activity'], name='projects_ti_followe_c27b7c_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='timelineentry',
+            unique_together={('follower_id', 'activity')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='feedfollow',
+            unique_together={('follower_id', 'project')},
+        ),
+        migrations.AddIndex(
+            model_name='feedactivity',
+            index=models.Index(fields=['project', '-id'], name='projects_fe_project_ff84d5_idx'),
+        ),
+        migrations.RunPython(import_activities, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 2.2.8 on 2026-10-17 12:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0042_local_feeds'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bugreport',
+            index=models.Index(fields=['-created_at', '-id'], name='projects_bu_created_4571d0_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='community',
+            index=models.Index(fields=['-created_at', '-id'], name='projects_co_created_e495c2_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='moneysupport',
+            index=models.Index(fields=['user', '-status_since', '-id'], name='projects_mo_user_id_434ed6_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='project',
+            index=models.Index(fields=['verified_status', '-created_at', '-id'], name='projects_pr_verifie_0043f6_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='report',
+            index=models.Index(fields=['project', '-published_at', '-id'], name='projects_re_project_b5c53d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='timesupport',
+            index=models.Index(fields=['user', '-status_since', '-id'], name='projects_ti_user_id_fbf7d8_idx'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 2.2.8 on 2026-10-17 12:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0043_list_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='moneysupport',
+            index=models.Index(fields=['project', 'status'], name='projects_mo_project_7e3fb6_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='moneysupport',
+            index=models.Index(fields=['necessity', 'status'], name='projects_mo_necessi_ad11e2_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='moneysupport',
+            index=models.Index(fields=['project', '-status_since'], name='projects_mo_project_d5359b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='moneysupport',
+            index=models.Index(condition=models.Q(status='accepted'), fields=['status_since'], name='moneysupport_accepted_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='project',
+            index=models.Index(fields=['verified_status', 'community'], name='projects_pr_verifie_5b8ad4_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='thingsupport',
+            index=models.Index(fields=['necessity', 'status'], name='projects_th_necessi_f135c6_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='thingsupport',
+            index=models.Index(condition=models.Q(status='accepted'), fields=['status_since'], name='thingsupport_accepted_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='timesupport',
+            index=models.Index(fields=['necessity', 'status'], name='projects_ti_necessi_61bc22_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='timesupport',
+            index=models.Index(fields=['project', '-status_since'], name='projects_ti_project_ba87ee_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='timesupport',
+            index=models.Index(condition=models.Q(status='accepted'), fields=['status_since'], name='timesupport_accepted_idx'),
+        ),
+    ]
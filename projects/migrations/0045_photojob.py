@@ -0,0 +1,23 @@
+# Generated by Django 2.2.8 on 2026-10-17 12:26
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('photologue', '0011_auto_20190223_2138'),
+        ('projects', '0044_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PhotoJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('photo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='photologue.Photo')),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.8 on 2026-10-17 12:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0045_photojob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='photojob',
+            name='prepare',
+            field=models.BooleanField(default=False),
+        ),
+    ]
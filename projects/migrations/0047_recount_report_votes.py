@@ -0,0 +1,36 @@
+# Generated by Django 2.2.8 on 2026-10-17 12:42
+
+from django.db import migrations
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from vote.models import UP, DOWN
+
+
+def recount_votes(apps, schema_editor):
+    Report = apps.get_model('projects', 'Report')
+    Vote = apps.get_model('vote', 'Vote')
+
+    # Votes added through the admin never touched the counters
+    def count(action):
+        votes = Vote.objects.filter(
+            content_type__app_label='projects', content_type__model='report',
+            object_id=OuterRef('pk'), action=action)
+        return Coalesce(Subquery(
+            votes.order_by().values('object_id').annotate(c=Count('pk')).values('c'),
+            output_field=IntegerField()), 0)
+
+    Report.objects.update(num_vote_up=count(UP), num_vote_down=count(DOWN))
+    Report.objects.update(vote_score=F('num_vote_up') - F('num_vote_down'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0046_photojob_prepare'),
+        ('vote', '0004_auto_20170110_1150'),
+    ]
+
+    operations = [
+        migrations.RunPython(recount_votes, migrations.RunPython.noop),
+    ]
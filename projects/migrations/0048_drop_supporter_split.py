@@ -0,0 +1,21 @@
+# Generated by Django 2.2.8 on 2026-10-17 13:20
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0047_recount_report_votes'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='projectstats',
+            name='money_supporters',
+        ),
+        migrations.RemoveField(
+            model_name='projectstats',
+            name='time_supporters',
+        ),
+    ]
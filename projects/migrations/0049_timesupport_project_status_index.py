@@ -0,0 +1,17 @@
+# Generated by Django 2.2.8 on 2026-10-17 13:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0048_drop_supporter_split'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='timesupport',
+            index=models.Index(fields=['project', 'status'], name='projects_ti_project_28a783_idx'),
+        ),
+    ]
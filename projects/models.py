@@ -1,7 +1,9 @@
 from django.utils import timezone
 import datetime
 
-from django.db import models
+from django.db import connection, models, transaction
+from django.db.models import Count, Exists, F, FloatField, IntegerField, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 from django.urls import reverse
 from django.utils.translation import get_language
@@ -9,13 +11,14 @@ from django.utils.translation import get_language
 from django.core.validators import MaxValueValidator
 
 from django.contrib.auth.models import AbstractUser
+from django.contrib.contenttypes.models import ContentType
 
 from model_utils import Choices
 
 import rules
 from rules.contrib.models import RulesModelBase, RulesModelMixin
 
-from vote.models import VoteModel, UP, DOWN
+from vote.models import Vote, VoteModel, UP, DOWN
 
 from stream_django.activity import Activity
 
@@ -27,6 +30,8 @@ from photologue.models import Photo, Gallery
 
 from django_countries.fields import CountryField
 
+from horodeya.page_cache import PAGES_VERSION_KEY, bump_versions, get_versions
+
 
 def determine_community(object):
     if isinstance(object, Project):
@@ -37,6 +42,15 @@ def determine_community(object):
     return object
 
 
+def determine_community_id(object):
+    if isinstance(object, Project):
+        return object.community_id
+    elif isinstance(object, Report) or isinstance(object, Support):
+        return object.project.community_id
+
+    return object.id
+
+
 @rules.predicate
 def is_site_admin(user, object):
     return user.is_superuser
@@ -44,12 +58,18 @@ def is_site_admin(user, object):
 
 @rules.predicate
 def member_of_community(user, object):
-    return user.member_of(determine_community(object).id)
+    if not user.is_authenticated:
+        return False
+
+    return user.member_of(determine_community_id(object))
 
 
 @rules.predicate
 def admin_of_community(user, object):
-    return user == determine_community(object).admin
+    if not user.is_authenticated:
+        return False
+
+    return user.admin_of(determine_community_id(object))
 
 
 @rules.predicate
@@ -62,7 +82,7 @@ def myself(user, user2):
 
 @rules.predicate
 def has_a_community(user):
-    return user.communities.count() > 0
+    return len(user.community_ids()) > 0
 
 
 @rules.predicate
@@ -103,6 +123,7 @@ class Community(Timestamped):
             "view": rules.is_authenticated,
             "leave": member_of_community & ~admin_of_community
         }
+        indexes = [models.Index(fields=['-created_at', '-id'])]
 
     name = models.CharField(max_length=100, blank=False,
                             verbose_name=_('Name'))
@@ -175,14 +196,52 @@ class User(AbstractUser, RulesModelMixin, metaclass=RulesModelBase):
     def get_absolute_url(self):
         return reverse('account', kwargs={'pk': self.pk})
 
+    _community_ids = None
+    _admin_community_ids = None
+
+    def load_communities(self):
+        """Loads the communities the user is a member or an admin of in one query"""
+        memberships = User.communities.through.objects.filter(
+            community_id=OuterRef('pk'), user_id=self.pk)
+        communities = Community.objects.annotate(member=Exists(memberships)).filter(
+            Q(member=True) | Q(admin_id=self.pk)).values_list('pk', 'admin_id', 'member')
+
+        self._community_ids = set()
+        self._admin_community_ids = set()
+        for community_id, admin_id, member in communities:
+            if member:
+                self._community_ids.add(community_id)
+            if admin_id == self.pk:
+                self._admin_community_ids.add(community_id)
+
+    def forget_communities(self):
+        """Call after changing the communities so that they are loaded again"""
+        self._community_ids = None
+        self._admin_community_ids = None
+
+    def community_ids(self):
+        if self._community_ids is None:
+            self.load_communities()
+
+        return self._community_ids
+
+    def admin_community_ids(self):
+        if self._admin_community_ids is None:
+            self.load_communities()
+
+        return self._admin_community_ids
+
     def member_of(self, community_pk):
-        return self.communities.filter(pk=community_pk).exists()
+        return community_pk in self.community_ids()
+
+    def admin_of(self, community_pk):
+        return community_pk in self.admin_community_ids()
 
     def total_support_count(self):
         return self.moneysupport_set.count() + self.timesupport_set.count()
 
     def total_votes_count(self):
-        return len(Report.votes.all(self.pk, UP)) + len(Report.votes.all(self.pk, DOWN))
+        return Report.user_votes(self.pk).count()
 
 # TODO notify user on new project added
 
@@ -215,6 +274,80 @@ def get_report_translated_choices():
     return REPORT_TIMESPAN_CHOICES
 
 
+def stats_subquery(queryset, aggregate, output_field, group_by='project'):
+    value = queryset.order_by().values(group_by).annotate(
+        value=aggregate).values('value')
+    return Coalesce(Subquery(value, output_field=output_field), 0, output_field=output_field)
+
+
+class ProjectQuerySet(models.QuerySet):
+    def with_stats(self):
+        """Annotates the project stats so listing them costs a single query"""
+        project = OuterRef('pk')
+        money_statuses = [Support.STATUS.accepted, Support.STATUS.delivered]
+
+        return self.annotate(
+            annotated_money_collected=stats_subquery(
+                MoneySupport.objects.filter(
+                    project=project, status__in=money_statuses),
+                Sum('leva'), FloatField()),
+            annotated_money_needed=stats_subquery(
+                ThingNecessity.objects.filter(project=project),
+                Sum(F('count') * F('price')), IntegerField()),
+            annotated_things_needed=stats_subquery(
+                ThingNecessity.objects.filter(project=project),
+                Sum('count'), IntegerField()),
+            annotated_things_fulfilled=stats_subquery(
+                ThingSupport.objects.filter(
+                    necessity__project=project, status=Support.STATUS.accepted),
+                Count('pk'), IntegerField(), group_by='necessity__project'),
+            annotated_time_needed=stats_subquery(
+                TimeNecessity.objects.filter(project=project),
+                Sum('count'), IntegerField()),
+            annotated_time_fulfilled=stats_subquery(
+                TimeSupport.objects.filter(
+                    necessity__project=project, status=Support.STATUS.accepted),
+                Count('pk'), IntegerField(), group_by='necessity__project'),
+        )
+
+
+def with_user_counts(queryset):
+    """Annotates the support and vote counts of the users in a single query"""
+    user = OuterRef('pk')
+    report_type = ContentType.objects.get_for_model(Report)
+
+    return queryset.annotate(
+        money_support_count=stats_subquery(
+            MoneySupport.objects.filter(user=user),
+            Count('pk'), IntegerField(), group_by='user'),
+        time_support_count=stats_subquery(
+            TimeSupport.objects.filter(user=user),
+            Count('pk'), IntegerField(), group_by='user'),
+        votes_count=stats_subquery(
+            Vote.objects.filter(user_id=user, content_type=report_type),
+            Count('pk'), IntegerField(), group_by='user_id'),
+    )
+
+
+def project_cache_version_key(project_id):
+    return 'project-%d-version' % project_id
+
+
+def bump_project_cache_version(project_ids):
+    """Makes the cached fragments and pages of the projects stale"""
+    bump_versions([project_cache_version_key(project_id) for project_id in project_ids]
+                  + [PAGES_VERSION_KEY])
+
+
+def load_cache_versions(projects):
+    """Looks up the cache versions of a page of projects with one get_many instead of one get each"""
+    versions = get_versions([project_cache_version_key(project.pk) for project in projects])
+    for project, version in zip(projects, versions):
+        project.loaded_cache_version = version
+
+    return projects
+
+
 class Project(Timestamped):
     class Meta:
         rules_permissions = {
@@ -224,6 +357,12 @@ class Project(Timestamped):
             "view": rules.always_allow,
             "follow": rules.is_authenticated
         }
+        indexes = [
+            models.Index(fields=['verified_status', '-created_at', '-id']),
+            models.Index(fields=['verified_status', 'community']),
+        ]
+
+    objects = ProjectQuerySet.as_manager()
 
     TYPES = Choices('business', 'cause')
 
@@ -260,89 +399,89 @@ class Project(Timestamped):
     def key(self):
         return 'project-%d' % self.id
 
+    def cache_version(self):
+        """Part of the fragment cache keys of the project, see bump_project_cache_version"""
+        loaded = getattr(self, 'loaded_cache_version', None)
+        if loaded is not None:
+            return loaded
+
+        return get_versions([project_cache_version_key(self.pk)])[0]
+
+    def add_default_questions(self):
+        """
+        Gives the project a question for each QuestionPrototype, unless it already has questions.
+
+        Safe to run more than once, a concurrent run leaves the questions it
+        created in place thanks to the unique prototype and project pair.
+        """
+        if self.question_set.exists():
+            return
+
+        now = timezone.now()
+        prototypes = QuestionPrototype.objects.order_by('order', 'pk')
+        Question.objects.bulk_create([
+            Question(prototype=prototype, project=self, order=order,
+                     created_at=now, updated_at=now)
+            for order, prototype in enumerate(prototypes, 1)
+        ], ignore_conflicts=True)
+
+        # bulk_create sends no post_save for the project fragments
+        project_ids = [self.pk]
+        transaction.on_commit(lambda: bump_project_cache_version(project_ids))
+
     def __str__(self):
         return ' - '.join([self.community.name, self.name])
 
     def get_absolute_url(self):
         return reverse('projects:details', kwargs={'pk': self.pk})
 
-    # TODO normalize to a field, update on signal
-    def supporters_stats(self):
-        money_supporters = set()
-        time_supporters = set()
-        money = 0
-        time = datetime.timedelta(days=0)
-        for money_support in self.moneysupport_set.all():
-            money_supporters.add(money_support.user)
-            money += money_support.leva
+    def get_stats(self):
+        try:
+            return self.stats
+        except ProjectStats.DoesNotExist:
+            # Projects older than their stats row are counted without writing one,
+            # rebuild_project_stats fills them in
+            stats = ProjectStats(project=self)
+            stats.recount()
+            self.stats = stats
+            return stats
 
-        for time_support in self.timesupport_set.all():
-            time_supporters.add(time_support.user)
-            time += time_support.duration()
+    def stat(self, name):
+        annotated = getattr(self, 'annotated_%s' % name, None)
+        if annotated is not None:
+            return annotated
 
-        return len(money_supporters), money, len(time_supporters), time
+        return getattr(self.get_stats(), name)
 
     def total_supporters(self):
-        supporters = set()
-        for money_support in self.moneysupport_set.all():
-            supporters.add(money_support.user)
-        for time_support in self.timesupport_set.all():
-            supporters.add(time_support.user)
-
-        return len(supporters)
+        return self.stat('supporters')
 
     def money_support(self):
-        s = 0
-        for money_support in self.moneysupport_set.filter(status__in=[Support.STATUS.accepted, Support.STATUS.delivered]):
-            s += money_support.leva
-
-        return s
+        return self.stat('money_collected')
 
     def things_fulfilled(self):
-        s = 0
-        money_support = self.money_support()
-        for necessity in self.thingnecessity_set.all():
-            accepted = necessity.accepted_support()
-            s += accepted
-
-        return s
+        return self.stat('things_fulfilled')
 
     def things_still_needed(self):
         return self.things_needed() - self.things_fulfilled()
 
     def things_needed(self):
-        s = 0
-        for thing in self.thingnecessity_set.all():
-            s += thing.count
-
-        return s
+        return self.stat('things_needed')
 
     def time_fulfilled(self):
-        s = 0
-        for necessity in self.timenecessity_set.all():
-            s += necessity.accepted_support()
-
-        return s
+        return self.stat('time_fulfilled')
 
     def time_still_needed(self):
         return self.time_needed() - self.time_fulfilled()
 
     def time_needed(self):
-        s = 0
-        for time in self.timenecessity_set.all():
-            s += time.count
-
-        return s
+        return self.stat('time_needed')
 
     def money_still_needed(self):
         return self.money_needed() - self.money_support()
 
     def money_needed(self):
-        s = 0
-        for thing in self.thingnecessity_set.all():
-            s += thing.count * thing.price
-
-        return s
+        return self.stat('money_needed')
 
     def money_support_percent(self):
         money_needed = self.money_needed()
@@ -366,10 +505,66 @@ class Project(Timestamped):
         return int(100*self.time_fulfilled() / time_needed)
 
     def recent_time_support(self):
-        return self.timesupport_set.order_by('-status_since')
+        return self.timesupport_set.select_related('necessity').order_by('-status_since')
 
     def recent_money_support(self):
-        return self.moneysupport_set.order_by('-status_since')
+        return self.moneysupport_set.select_related('necessity').order_by('-status_since')
+
+
+class ProjectStats(models.Model):
+    """
+    Denormalized funding figures of a project.
+
+    Kept up to date by the signal handlers in projects.signals whenever a
+    support or a necessity of the project changes, rebuilt from scratch by
+    the rebuild_project_stats command.
+    """
+    project = models.OneToOneField(
+        Project, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    money_collected = models.FloatField(default=0)
+    money_needed = models.IntegerField(default=0)
+    things_needed = models.IntegerField(default=0)
+    things_fulfilled = models.IntegerField(default=0)
+    time_needed = models.IntegerField(default=0)
+    time_fulfilled = models.IntegerField(default=0)
+    supporters = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return 'stats for project %d' % self.project_id
+
+    def recount(self):
+        project_id = self.project_id
+
+        money_statuses = [Support.STATUS.accepted, Support.STATUS.delivered]
+        self.money_collected = MoneySupport.objects.filter(
+            project_id=project_id, status__in=money_statuses).aggregate(s=Sum('leva'))['s'] or 0
+
+        things = ThingNecessity.objects.filter(project_id=project_id).aggregate(
+            count=Sum('count'), price=Sum(F('count') * F('price')))
+        self.things_needed = things['count'] or 0
+        self.money_needed = things['price'] or 0
+        self.things_fulfilled = ThingSupport.objects.filter(
+            necessity__project_id=project_id, status=Support.STATUS.accepted).count()
+
+        self.time_needed = TimeNecessity.objects.filter(
+            project_id=project_id).aggregate(count=Sum('count'))['count'] or 0
+        self.time_fulfilled = TimeSupport.objects.filter(
+            necessity__project_id=project_id, status=Support.STATUS.accepted).count()
+
+        # The union drops the users supporting with both money and time
+        self.supporters = MoneySupport.objects.filter(project_id=project_id).values('user_id').union(
+            TimeSupport.objects.filter(project_id=project_id).values('user_id')).count()
+
+    @classmethod
+    def refresh(cls, project_id):
+        with transaction.atomic():
+            stats, created = cls.objects.select_for_update().get_or_create(
+                project_id=project_id)
+            stats.recount()
+            stats.save()
+
+        return stats
 
 
 class Announcement(Timestamped, Activity):
@@ -404,6 +599,7 @@ class Report(VoteModel, Timestamped, Activity):
             "change": member_of_community,
             "view": rules.is_authenticated,
         }
+        indexes = [models.Index(fields=['project', '-published_at', '-id'])]
     name = models.CharField(max_length=50, verbose_name=_('Name'))
     project = models.ForeignKey(Project, on_delete=models.PROTECT)
     text = models.TextField(_('text'))
@@ -423,9 +619,106 @@ class Report(VoteModel, Timestamped, Activity):
     def get_absolute_url(self):
         return reverse('projects:report_details', kwargs={'pk': self.pk})
 
+    @staticmethod
+    def user_votes(user_id):
+        return Vote.objects.filter(
+            user_id=user_id, content_type=ContentType.objects.get_for_model(Report))
+
+    @classmethod
+    def voted_actions(cls, user_id, report_ids):
+        """Returns the action the user voted with for each of the reports they voted on"""
+        if user_id is None:
+            return {}
+
+        return dict(cls.user_votes(user_id).filter(
+            object_id__in=report_ids).values_list('object_id', 'action'))
+
+    def count_votes(self, up=0, down=0):
+        """Adds to the vote counters in the database, so concurrent votes are not lost"""
+        Report.objects.filter(pk=self.pk).update(
+            num_vote_up=F('num_vote_up') + up,
+            num_vote_down=F('num_vote_down') + down,
+            vote_score=F('vote_score') + up - down)
+
+    def toggle_vote(self, user_id, action):
+        """
+        Votes with the action, or removes the vote when the user already voted with it.
+
+        The report row is locked for the transaction so double clicks run one
+        after the other. Returns the user's action afterwards, None when the
+        vote was removed, and the new up and down tallies.
+        """
+        with transaction.atomic():
+            report = Report.objects.select_for_update().only(
+                'num_vote_up', 'num_vote_down').get(pk=self.pk)
+
+            votes = Report.user_votes(user_id).filter(object_id=self.pk)
+            actions = list(votes.values_list('action', flat=True))
+
+            if action in actions:
+                votes.delete()
+                voted = None
+                up, down = -actions.count(UP), -actions.count(DOWN)
+            else:
+                # Turning a vote around leaves a single vote, like django-vote does
+                if actions:
+                    votes.update(action=action)
+                else:
+                    Vote.objects.create(user_id=user_id, object_id=self.pk, action=action,
+                                        content_type=ContentType.objects.get_for_model(Report))
+                voted = action
+                up, down = (1, -len(actions)) if action == UP else (-len(actions), 1)
+
+            self.count_votes(up=up, down=down)
+
+        return voted, report.num_vote_up + up, report.num_vote_down + down
+
 # TODO notify in feed
 
 
+class FeedFollow(models.Model):
+    """A user timeline following a project, follower 0 is the public timeline"""
+    class Meta:
+        unique_together = ['follower_id', 'project']
+
+    follower_id = models.IntegerField()
+    project = models.ForeignKey(Project, on_delete=models.CASCADE)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+
+class FeedActivity(models.Model):
+    class Meta:
+        indexes = [models.Index(fields=['project', '-id'])]
+
+    project = models.ForeignKey(Project, on_delete=models.CASCADE)
+    verb = models.CharField(max_length=20)
+    announcement = models.ForeignKey(
+        Announcement, on_delete=models.CASCADE, null=True)
+    report = models.ForeignKey(Report, on_delete=models.CASCADE, null=True)
+    time = models.DateTimeField()
+
+    @property
+    def actor(self):
+        return self.project
+
+    @property
+    def object(self):
+        return self.announcement or self.report
+
+    def __str__(self):
+        return '%s %s' % (self.verb, self.project_id)
+
+
+class TimelineEntry(models.Model):
+    class Meta:
+        unique_together = ['follower_id', 'activity']
+        indexes = [models.Index(fields=['follower_id', '-activity'])]
+
+    follower_id = models.IntegerField()
+    activity = models.ForeignKey(FeedActivity, on_delete=models.CASCADE)
+    seen = models.BooleanField(default=False)
+
+
 class TimeNecessity(Timestamped):
     class Meta:
         rules_permissions = {
@@ -478,61 +771,98 @@ class ThingNecessity(Timestamped):
     count = models.IntegerField(_('count'))
 
     def create_thing_support_from_unused_money_support(self):
-        unused_money_support = list(filter(
-            lambda s: not s.thingsupport_set.all().exists(),
-            self.accepted_money_support()
-        ))
+        with transaction.atomic():
+            ThingNecessity.objects.select_for_update().get(pk=self.pk)
 
-        price = self.price
-        use_supports = []
+            still_needed = self.still_needed()
+            if still_needed <= 0:
+                return False
+
+            unused_money_support = self.money_supports.filter(
+                status=Support.STATUS.accepted,
+                thingsupport__isnull=True).order_by('pk')
+
+            allocations, reminder = self.allocate_money_support(
+                unused_money_support, still_needed)
 
-        if self.still_needed() == 0:
-            return False
+            self.save_allocations(allocations, reminder)
 
-        for support in unused_money_support:
+        return True
+
+    def allocate_money_support(self, money_supports, still_needed):
+        """
+        Splits the money supports into groups paying for one thing each.
+
+        Returns the groups and an optional (support, leva) pair with the
+        money left over once nothing more is needed.
+        """
+        allocations = []
+        use_supports = []
+        price = self.price
+
+        for support in money_supports:
             use_supports.append(support)
+            remaining = support.leva
 
-            if support.leva < price:
-                price -= support.leva
-                continue
-
-            remaining = support.leva - price
-            while remaining >= 0:
-                thing_support = self.supports.create(
-                    price=self.price,
-                    project=self.project,
-                    user=self.project.community.admin,
-                    comment='Auto generated',
-                    status=Support.STATUS.accepted,
-                    status_since=timezone.now(),
-                )
-
-                thing_support.from_money_supports.set(use_supports)
+            while remaining >= price:
+                remaining -= price
+                allocations.append(use_supports)
                 use_supports = []
                 price = self.price
 
-                if remaining == 0:
-                    break
-
-                if self.still_needed() == 0:
-                    self.money_supports.create(
-                        leva=remaining,
-                        project=self.project,
-                        user=support.user,
-                        comment='reminder from %d' % support.id,
-                        # so that admin is forced to choose Necessity to spend it on
-                        status=Support.STATUS.review,
-                        status_since=timezone.now(),
-                    )
-                    return True
+                if len(allocations) == still_needed:
+                    return allocations, (support, remaining) if remaining > 0 else None
 
                 if remaining > 0:
                     use_supports.append(support)
-                    saved_price = price
-                    price -= remaining
-                    remaining -= saved_price
 
-        return True
+            price -= remaining
+
+        return allocations, None
+
+    def save_allocations(self, allocations, reminder):
+        project = Project.objects.select_related(
+            'community').get(pk=self.project_id)
+        now = timezone.now()
+
+        thing_supports = [ThingSupport(
+            necessity=self,
+            price=self.price,
+            project=project,
+            user_id=project.community.admin_id,
+            comment='Auto generated',
+            status=Support.STATUS.accepted,
+            status_since=now,
+            created_at=now,
+            updated_at=now,
+        ) for _ in allocations]
+
+        if connection.features.can_return_ids_from_bulk_insert:
+            ThingSupport.objects.bulk_create(thing_supports)
+        else:
+            for thing_support in thing_supports:
+                thing_support.save()
+
+        Through = ThingSupport.from_money_supports.through
+        Through.objects.bulk_create([
+            Through(thingsupport_id=thing_support.pk, moneysupport_id=support.pk)
+            for thing_support, supports in zip(thing_supports, allocations)
+            for support in supports
+        ])
+
+        if reminder:
+            support, leva = reminder
+            self.money_supports.create(
+                leva=leva,
+                project=project,
+                user_id=support.user_id,
+                comment='reminder from %d' % support.id,
+                # so that admin is forced to choose Necessity to spend it on
+                status=Support.STATUS.review,
+                status_since=now,
+            )
+
+        ProjectStats.refresh(self.project_id)
 
     def __str__(self):
         return "%s" % self.name
@@ -565,6 +895,9 @@ class ThingNecessity(Timestamped):
         return reverse('projects:thing_necessity_details', kwargs={'pk': self.pk})
 
 
+SUPPORT_DELIVERY_PERIOD = datetime.timedelta(days=30)
+
+
 class Support(Timestamped):
 
     class Meta:
@@ -607,19 +940,15 @@ class Support(Timestamped):
         if not self.status == 'accepted':
             return None
 
-        return self.status_since + datetime.timedelta(days=30)
+        return self.status_since + SUPPORT_DELIVERY_PERIOD
 
     def expired(self):
+        """The expire_supports command persists the status, this only reads it"""
         if self.status == 'expired':
             return True
 
         expires = self.delivery_expires()
-        if expires and expires < timezone.now():
-            self.status = 'expired'
-            self.save()
-            return True
-
-        return False
+        return bool(expires and expires < timezone.now())
 
     def set_accepted(self, accepted=True):
         if accepted is True:
@@ -651,6 +980,14 @@ class MoneySupport(Support):
             "list": member_of_community,
             "list-user": myself
         }
+        indexes = [
+            models.Index(fields=['user', '-status_since', '-id']),
+            models.Index(fields=['project', 'status']),
+            models.Index(fields=['necessity', 'status']),
+            models.Index(fields=['project', '-status_since']),
+            models.Index(fields=['status_since'], name='moneysupport_accepted_idx',
+                         condition=Q(status='accepted')),
+        ]
 
     necessity = models.ForeignKey(ThingNecessity, on_delete=models.PROTECT, related_name='money_supports',
                                   null=True, blank=True, verbose_name=_('Which necessity do you wish to donate to'))
@@ -671,17 +1008,18 @@ class MoneySupport(Support):
         return 'money'
 
     def set_accepted(self, accepted=True):
-        super(MoneySupport, self).set_accepted(accepted)
+        with transaction.atomic():
+            super(MoneySupport, self).set_accepted(accepted)
 
-        if accepted:
-            if not self.necessity:
-                raise RuntimeError(
-                    'Expected necessity to be set when accepting money support')
+            if accepted:
+                if not self.necessity:
+                    raise RuntimeError(
+                        'Expected necessity to be set when accepting money support')
 
-            new_accepted = self.necessity.create_thing_support_from_unused_money_support()
+                new_accepted = self.necessity.create_thing_support_from_unused_money_support()
 
-            if new_accepted != accepted:
-                return super(MoneySupport, self).set_accepted(None)
+                if new_accepted != accepted:
+                    return super(MoneySupport, self).set_accepted(None)
 
         return accepted
 
@@ -703,6 +1041,11 @@ class ThingSupport(Support):
             "list": member_of_community,
             "list-user": myself
         }
+        indexes = [
+            models.Index(fields=['necessity', 'status']),
+            models.Index(fields=['status_since'], name='thingsupport_accepted_idx',
+                         condition=Q(status='accepted')),
+        ]
 
     necessity = models.ForeignKey(
         ThingNecessity, on_delete=models.PROTECT, related_name='supports')
@@ -734,6 +1077,67 @@ class Answer(Timestamped):
     question = models.ForeignKey('Question', on_delete=models.CASCADE)
     answer = models.TextField(_('answer'), null=False, blank=True)
 
+    @classmethod
+    def save_answers(cls, project_id, values):
+        """
+        Creates or updates the answers of the project, values maps question ids to answers.
+
+        On PostgreSQL this is a single INSERT ... ON CONFLICT on the project
+        and question pair, other databases read the existing answers first.
+        """
+        if not values:
+            return
+
+        now = timezone.now()
+        if connection.vendor == 'postgresql':
+            cls.upsert_answers(project_id, values, now)
+            return
+
+        with transaction.atomic():
+            answers = {answer.question_id: answer for answer in cls.objects.filter(
+                project_id=project_id, question_id__in=values)}
+
+            changed = []
+            for question_id, value in values.items():
+                answer = answers.get(question_id)
+                if answer is not None and answer.answer != value:
+                    answer.answer = value
+                    answer.updated_at = now
+                    changed.append(answer)
+
+            cls.objects.bulk_update(changed, ['answer', 'updated_at'])
+            cls.objects.bulk_create([
+                cls(project_id=project_id, question_id=question_id, answer=value,
+                    created_at=now, updated_at=now)
+                for question_id, value in values.items() if question_id not in answers
+            ])
+
+    @classmethod
+    def upsert_answers(cls, project_id, values, now):
+        fields = [cls._meta.get_field(name) for name in
+                  ['project', 'question', 'answer', 'created_at', 'updated_at']]
+        project, question, answer, created_at, updated_at = [
+            connection.ops.quote_name(field.column) for field in fields]
+        table = connection.ops.quote_name(cls._meta.db_table)
+        now = fields[3].get_db_prep_value(now, connection)
+
+        params = []
+        for question_id, value in values.items():
+            params.extend([project_id, question_id, value, now, now])
+
+        # Unchanged answers keep their updated_at
+        sql = ('INSERT INTO {table} ({project}, {question}, {answer}, {created_at}, {updated_at}) '
+               'VALUES {rows} '
+               'ON CONFLICT ({project}, {question}) DO UPDATE '
+               'SET {answer} = EXCLUDED.{answer}, {updated_at} = EXCLUDED.{updated_at} '
+               'WHERE {table}.{answer} <> EXCLUDED.{answer}').format(
+            table=table, project=project, question=question, answer=answer,
+            created_at=created_at, updated_at=updated_at,
+            rows=', '.join(['(%s, %s, %s, %s, %s)'] * len(values)))
+
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+
 # TODO notify in feed
 
 
@@ -748,6 +1152,14 @@ class TimeSupport(Support):
             "mark_delivered": member_of_community,
             "list": member_of_community
         }
+        indexes = [
+            models.Index(fields=['user', '-status_since', '-id']),
+            models.Index(fields=['project', 'status']),
+            models.Index(fields=['necessity', 'status']),
+            models.Index(fields=['project', '-status_since']),
+            models.Index(fields=['status_since'], name='timesupport_accepted_idx',
+                         condition=Q(status='accepted')),
+        ]
         unique_together = ['necessity', 'user']
 
     necessity = models.ForeignKey(
@@ -862,6 +1274,9 @@ class LegalEntityDonatorData(Timestamped):
 
 
 class BugReport(Timestamped):
+    class Meta:
+        indexes = [models.Index(fields=['-created_at', '-id'])]
+
     email = models.EmailField(_('email'))
     message = models.TextField(_('message'))
 
@@ -869,3 +1284,30 @@ class BugReport(Timestamped):
 class EpayMoneySupport(Support):
     amount = models.FloatField(verbose_name=_(
         'How much do you wish to donate'))
+
+
+class NotificationJob(models.Model):
+    """A notification waiting to be fanned out by the send_notifications worker"""
+    actor_content_type = models.ForeignKey(
+        ContentType, on_delete=models.CASCADE)
+    actor_object_id = models.CharField(max_length=255)
+    verb = models.CharField(max_length=255)
+    recipients = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def recipient_ids(self):
+        return [int(pk) for pk in self.recipients.split(',') if pk]
+
+    def __str__(self):
+        return self.verb
+
+
+class PhotoJob(models.Model):
+    """An uploaded photo waiting for its sizes to be generated by the generate_photo_sizes worker"""
+    photo = models.ForeignKey(Photo, on_delete=models.CASCADE)
+    # Uploaded straight to the bucket, so prepare_upload has not run on it yet
+    prepare = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return str(self.photo)
@@ -0,0 +1,91 @@
+import logging
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.utils import timezone
+
+from notifications.models import Notification
+
+from projects.models import NotificationJob
+
+BATCH_SIZE = 500
+
+logger = logging.getLogger(__name__)
+
+
+def build_notification(actor, recipient_id, verb, timestamp=None):
+    """The actor is a model instance, or the content type id and object id of one"""
+    if isinstance(actor, tuple):
+        actor_content_type_id, actor_object_id = actor
+    else:
+        actor_content_type_id = ContentType.objects.get_for_model(actor).pk
+        actor_object_id = actor.pk
+
+    return Notification(
+        recipient_id=recipient_id,
+        actor_content_type_id=actor_content_type_id,
+        actor_object_id=actor_object_id,
+        verb=str(verb),
+        timestamp=timestamp or timezone.now(),
+    )
+
+
+def bulk_notify(notifications):
+    return Notification.objects.bulk_create(notifications, batch_size=BATCH_SIZE)
+
+
+def notify_users(actor, recipients, verb):
+    """
+    Notifies every user of the recipients queryset.
+
+    The notifications are queued for the send_notifications worker, unless
+    NOTIFICATIONS_SYNC is set in which case they are written right away.
+    """
+    job = NotificationJob(
+        actor_content_type=ContentType.objects.get_for_model(actor),
+        actor_object_id=str(actor.pk),
+        verb=str(verb),
+        recipients=','.join(
+            str(pk) for pk in recipients.values_list('pk', flat=True)),
+    )
+
+    if settings.NOTIFICATIONS_SYNC:
+        deliver(job)
+    else:
+        job.save()
+
+
+def deliver(job):
+    timestamp = job.created_at or timezone.now()
+    actor = (job.actor_content_type_id, job.actor_object_id)
+    recipient_ids = job.recipient_ids()
+
+    for i in range(0, len(recipient_ids), BATCH_SIZE):
+        bulk_notify([
+            build_notification(actor, recipient_id, job.verb, timestamp)
+            for recipient_id in recipient_ids[i:i + BATCH_SIZE]
+        ])
+
+
+def deliver_queued(limit=100):
+    """
+    Delivers up to limit queued jobs, returns how many were done.
+
+    A job that fails is logged and dropped, so it does not roll back the
+    others and is not claimed again on every run.
+    """
+    with transaction.atomic():
+        jobs = list(NotificationJob.objects.select_for_update(
+            skip_locked=True).order_by('pk')[:limit])
+
+        for job in jobs:
+            try:
+                with transaction.atomic():
+                    deliver(job)
+            except Exception:
+                logger.exception('Delivering notification job %d failed', job.pk)
+
+        NotificationJob.objects.filter(pk__in=[job.pk for job in jobs]).delete()
+
+    return len(jobs)
@@ -0,0 +1,57 @@
+from django.conf import settings
+from django.db.models import Q
+
+
+def keyset_filter(ordering, values):
+    """Builds the condition selecting the rows that come after `values` in `ordering`"""
+    condition = Q()
+    equal = Q()
+
+    for field, value in zip(ordering, values):
+        name = field.lstrip('-')
+        lookup = '__lt' if field.startswith('-') else '__gt'
+        condition |= equal & Q(**{name + lookup: value})
+        equal &= Q(**{name: value})
+
+    return condition
+
+
+def keyset_page(queryset, before=None, ordering=('-created_at', '-id'), size=None):
+    """Returns one page of the queryset and the cursor of the next one
+
+    The cursor is the pk of the last row on the page. The next page seeks past
+    that row's ordering values instead of counting an OFFSET, so it costs the
+    same however deep the user pages. The last field in `ordering` must be unique.
+    """
+    size = size or settings.PAGE_SIZE
+    queryset = queryset.order_by(*ordering)
+
+    if before:
+        names = [field.lstrip('-') for field in ordering]
+        values = queryset.model._base_manager.filter(
+            pk=before).values_list(*names).first()
+        if values is not None:
+            queryset = queryset.filter(keyset_filter(ordering, values))
+
+    page = list(queryset[:size + 1])
+    if len(page) > size:
+        return page[:size], page[size - 1].pk
+
+    return page, None
+
+
+def get_cursor(request):
+    before = request.GET.get('before', '')
+    return int(before) if before.isdigit() else None
+
+
+class KeysetPaginationMixin:
+    """Pages the object list of a ListView with keyset_page"""
+    keyset_ordering = ('-created_at', '-id')
+
+    def get_context_data(self, **kwargs):
+        page, next_cursor = keyset_page(
+            self.object_list, get_cursor(self.request), self.keyset_ordering)
+        context = super().get_context_data(object_list=page, **kwargs)
+        context['next_cursor'] = next_cursor
+        return context
@@ -0,0 +1,163 @@
+import logging
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+
+from PIL import Image, ImageOps
+from photologue.models import PhotoSizeCache
+
+from projects.models import PhotoJob, Project, bump_project_cache_version
+
+# Other formats, like animated GIFs, are stored as they were uploaded
+PREPARED_FORMATS = ['JPEG', 'PNG', 'WEBP']
+
+PLACEHOLDER = 'media/photo-placeholder.svg'
+
+logger = logging.getLogger(__name__)
+
+
+def prepare_upload(image):
+    """
+    Downscales the upload to PHOTO_MAX_SIZE and strips its EXIF data.
+
+    The image is first rotated the way the EXIF orientation says, since that
+    is lost with the rest of the EXIF data.
+    """
+    try:
+        im = Image.open(image)
+        im_format = im.format
+        if im_format not in PREPARED_FORMATS:
+            image.seek(0)
+            return image
+
+        im = ImageOps.exif_transpose(im)
+    except (OSError, SyntaxError):
+        image.seek(0)
+        return image
+
+    im.info.pop('exif', None)
+    im.thumbnail((settings.PHOTO_MAX_SIZE, settings.PHOTO_MAX_SIZE), Image.LANCZOS)
+
+    buffer = BytesIO()
+    if im_format == 'JPEG':
+        if im.mode not in ('RGB', 'L'):
+            im = im.convert('RGB')
+        im.save(buffer, im_format, quality=90, optimize=True)
+    else:
+        im.save(buffer, im_format)
+
+    return ContentFile(buffer.getvalue(), name=image.name)
+
+
+def photo_pending(photo):
+    """Whether the photo still waits in the queue, kept on the instance once looked up"""
+    if not hasattr(photo, 'pending'):
+        photo.pending = PhotoJob.objects.filter(photo=photo).exists()
+
+    return photo.pending
+
+
+def mark_pending(photos):
+    """Looks up which of the photos are pending with one query, returns them as a list"""
+    photos = list(photos)
+    pending = set()
+    if photos:
+        pending = set(PhotoJob.objects.filter(
+            photo_id__in=[photo.pk for photo in photos]).values_list('photo_id', flat=True))
+
+    for photo in photos:
+        photo.pending = photo.pk in pending
+
+    return photos
+
+
+def save_photo(photo, prepare=False):
+    """Saves a new photo and queues its sizes"""
+    # Photo.save would generate the pre_cache sizes right here
+    photo.pre_cache = lambda: None
+    photo.save()
+    del photo.pre_cache
+
+    queue_photo_sizes(photo, prepare)
+    return photo
+
+
+def queue_photo_sizes(photo, prepare=False):
+    """
+    Generates all the photo sizes of a new photo.
+
+    The photo is queued for the generate_photo_sizes worker, unless
+    PHOTO_SIZES_SYNC is set in which case they are generated right away.
+    Until then the pages show a placeholder instead of the photo. With
+    `prepare` the stored original goes through prepare_upload first.
+    """
+    if settings.PHOTO_SIZES_SYNC:
+        generate_photo(photo, prepare)
+        return
+
+    PhotoJob.objects.create(photo=photo, prepare=prepare)
+
+
+def prepare_stored(photo):
+    """Runs prepare_upload on the stored original, returns False when it is not an image"""
+    storage = photo.image.storage
+
+    with storage.open(photo.image.name) as original:
+        try:
+            Image.open(original).verify()
+        except (OSError, SyntaxError):
+            return False
+
+        original.seek(0)
+        prepared = prepare_upload(original)
+        if prepared is original:
+            return True
+
+        # MediaStorage does not overwrite, free the name first
+        storage.delete(photo.image.name)
+        storage.save(photo.image.name, prepared)
+
+    return True
+
+
+def generate_photo(photo, prepare=False):
+    if prepare and not prepare_stored(photo):
+        # The browser said it was an image, it was not
+        photo.delete()
+        return
+
+    generate_sizes(photo)
+
+
+def generate_sizes(photo):
+    for photosize in PhotoSizeCache().sizes.values():
+        photo.create_size(photosize)
+
+    # The cached gallery fragments still show the placeholder
+    bump_project_cache_version(list(Project.objects.filter(
+        gallery__photos=photo).values_list('pk', flat=True)))
+
+
+def generate_queued(limit=10):
+    """
+    Generates the sizes of up to limit queued photos, returns how many were done.
+
+    A job that fails is logged and dropped, so one broken upload does not
+    keep the rest of the queue waiting.
+    """
+    with transaction.atomic():
+        jobs = list(PhotoJob.objects.select_for_update(
+            skip_locked=True, of=('self',)).select_related('photo').order_by('pk')[:limit])
+
+        for job in jobs:
+            try:
+                with transaction.atomic():
+                    generate_photo(job.photo, job.prepare)
+            except Exception:
+                logger.exception('Generating the sizes of photo %d failed', job.photo_id)
+
+        PhotoJob.objects.filter(pk__in=[job.pk for job in jobs]).delete()
+
+    return len(jobs)
@@ -0,0 +1,93 @@
+from rest_framework import serializers
+
+from projects.models import Community, Project, ThingNecessity, TimeNecessity, MoneySupport, TimeSupport
+
+
+def requested_fields(request):
+    """The field names in ?fields=, or None when all fields are wanted"""
+    fields = request.query_params.get('fields') if request else None
+    if not fields:
+        return None
+
+    return {field.strip() for field in fields.split(',') if field.strip()}
+
+
+class SparseFieldsetMixin:
+    """Leaves out the fields which are not listed in ?fields="""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        fields = requested_fields(self.context.get('request'))
+        if fields is not None:
+            for name in set(self.fields) - fields:
+                self.fields.pop(name)
+
+
+class CommunitySerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Community
+        fields = ['id', 'name', 'type', 'mission', 'website', 'text',
+                  'facebook_page', 'created_at', 'updated_at']
+
+
+# Filled from the annotations of Project.objects.with_stats()
+STATS_FIELDS = ['money_collected', 'money_needed', 'things_needed',
+                'things_fulfilled', 'time_needed', 'time_fulfilled']
+
+
+class ProjectSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    community_name = serializers.CharField(source='community.name', read_only=True)
+    url = serializers.CharField(source='get_absolute_url', read_only=True)
+
+    money_collected = serializers.FloatField(source='annotated_money_collected', read_only=True)
+    money_needed = serializers.IntegerField(source='annotated_money_needed', read_only=True)
+    things_needed = serializers.IntegerField(source='annotated_things_needed', read_only=True)
+    things_fulfilled = serializers.IntegerField(source='annotated_things_fulfilled', read_only=True)
+    time_needed = serializers.IntegerField(source='annotated_time_needed', read_only=True)
+    time_fulfilled = serializers.IntegerField(source='annotated_time_fulfilled', read_only=True)
+
+    class Meta:
+        model = Project
+        fields = ['id', 'url', 'type', 'name', 'description', 'text', 'location', 'goal',
+                  'category', 'start_date', 'end_date', 'community', 'community_name',
+                  'created_at', 'updated_at'] + STATS_FIELDS
+
+
+class ThingNecessitySerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    class Meta:
+        model = ThingNecessity
+        fields = ['id', 'project', 'name', 'description', 'price', 'count',
+                  'created_at', 'updated_at']
+
+
+class TimeNecessitySerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    class Meta:
+        model = TimeNecessity
+        fields = ['id', 'project', 'name', 'description', 'price', 'count',
+                  'start_date', 'end_date', 'created_at', 'updated_at']
+
+
+class PublicSupportSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    user = serializers.SerializerMethodField()
+    user_name = serializers.SerializerMethodField()
+
+    def get_user(self, support):
+        return None if getattr(support, 'anonymous', False) else support.user_id
+
+    def get_user_name(self, support):
+        return None if getattr(support, 'anonymous', False) else str(support.user)
+
+
+class MoneySupportSerializer(PublicSupportSerializer):
+    class Meta:
+        model = MoneySupport
+        fields = ['id', 'project', 'necessity', 'leva', 'status', 'status_since',
+                  'user', 'user_name']
+
+
+class TimeSupportSerializer(PublicSupportSerializer):
+    class Meta:
+        model = TimeSupport
+        fields = ['id', 'project', 'necessity', 'status', 'status_since',
+                  'start_date', 'end_date', 'user', 'user_name']
@@ -0,0 +1,109 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_save, post_delete, pre_delete
+
+from photologue.models import Gallery, Photo
+
+from projects.models import Community, Project, ProjectStats, MoneySupport, EpayMoneySupport, ThingSupport, TimeSupport, ThingNecessity, TimeNecessity, Question, Announcement, Report, bump_project_cache_version
+from projects.feeds import get_feed_backend
+
+STATS_SENDERS = [MoneySupport, ThingSupport,
+                 TimeSupport, ThingNecessity, TimeNecessity]
+
+
+def refresh_project_stats(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+
+    ProjectStats.refresh(instance.project_id)
+
+
+for sender in STATS_SENDERS:
+    post_save.connect(refresh_project_stats, sender=sender,
+                      dispatch_uid='project_stats_save_%s' % sender.__name__)
+    post_delete.connect(refresh_project_stats, sender=sender,
+                        dispatch_uid='project_stats_delete_%s' % sender.__name__)
+
+
+def create_project_stats(sender, instance, created, **kwargs):
+    # So that showing the stats never has to write them
+    if kwargs.get('raw') or not created:
+        return
+
+    ProjectStats.objects.get_or_create(project=instance)
+
+
+post_save.connect(create_project_stats, sender=Project,
+                  dispatch_uid='project_stats_create')
+
+
+def add_feed_activity(sender, instance, created, **kwargs):
+    if kwargs.get('raw') or not created:
+        return
+
+    get_feed_backend().add_activity(instance)
+
+
+for sender in [Announcement, Report]:
+    post_save.connect(add_feed_activity, sender=sender,
+                      dispatch_uid='feed_activity_%s' % sender.__name__)
+
+
+# Announcements and reports are on the timeline of the cached project page
+FRAGMENT_SENDERS = [Project, MoneySupport, EpayMoneySupport, ThingSupport,
+                    TimeSupport, ThingNecessity, TimeNecessity, Question,
+                    Announcement, Report]
+
+
+def bump_after_commit(project_ids):
+    # Bumping before the commit could let a request cache the old data under the new version
+    transaction.on_commit(lambda: bump_project_cache_version(project_ids))
+
+
+def invalidate_project_fragments(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+
+    bump_after_commit([instance.pk if sender is Project else instance.project_id])
+
+
+def invalidate_community_fragments(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+
+    bump_after_commit(list(Project.objects.filter(
+        community=instance).values_list('pk', flat=True)))
+
+
+def invalidate_gallery_fragments(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+
+    if isinstance(instance, Gallery):
+        gallery_ids = {instance.pk}
+    elif isinstance(instance, Photo):
+        gallery_ids = set(instance.galleries.values_list('pk', flat=True))
+        gallery_ids.update(kwargs.get('pk_set') or [])
+    else:
+        gallery_ids = {instance.gallery_id}
+
+    bump_after_commit(list(Project.objects.filter(
+        gallery__in=gallery_ids).values_list('pk', flat=True)))
+
+
+for sender in FRAGMENT_SENDERS:
+    post_save.connect(invalidate_project_fragments, sender=sender,
+                      dispatch_uid='project_fragments_save_%s' % sender.__name__)
+    post_delete.connect(invalidate_project_fragments, sender=sender,
+                        dispatch_uid='project_fragments_delete_%s' % sender.__name__)
+
+post_save.connect(invalidate_community_fragments, sender=Community,
+                  dispatch_uid='community_fragments_save')
+
+# The gallery block shows the public photos in their sort order
+for sender in [Gallery, Photo, Gallery.photos.through]:
+    post_save.connect(invalidate_gallery_fragments, sender=sender,
+                      dispatch_uid='gallery_fragments_save_%s' % sender.__name__)
+pre_delete.connect(invalidate_gallery_fragments, sender=Photo,
+                   dispatch_uid='gallery_fragments_delete_photo')
+m2m_changed.connect(invalidate_gallery_fragments, sender=Gallery.photos.through,
+                    dispatch_uid='gallery_fragments_photos')
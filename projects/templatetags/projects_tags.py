@@ -1,9 +1,11 @@
 from django import template
+from django.templatetags.static import static
+from django.template import loader
 from django.utils.translation import gettext as _
 from django.utils.translation import gettext_lazy
 
-from vote.models import UP, DOWN
 from ..models import Support
+from ..photos import PLACEHOLDER, mark_pending, photo_pending
 
 register = template.Library()
 
@@ -11,9 +13,16 @@ register = template.Library()
 def member_of(user, community_pk):
     return user.is_authenticated and user.member_of(community_pk)
 
-@register.simple_tag
-def vote_exists(report, user_pk):
-    return report.votes.exists(user_pk, action=UP) or report.votes.exists(user_pk, action=DOWN)
+@register.simple_tag(takes_context=True)
+def render_activity(context, activity):
+    if hasattr(activity, 'verb'):
+        verb = activity.verb
+    else:
+        verb = activity['verb']
+
+    context = context.flatten()
+    context['activity'] = activity
+    return loader.get_template('activity/%s.html' % verb).render(context)
 
 @register.simple_tag
 def format_answer(answer):
@@ -53,6 +62,26 @@ STATUS_COLOR = {
 def status_color(status):
     return STATUS_COLOR.get(status, 'default')
 
+@register.filter
+def photo_url(photo, size):
+    """The URL of a photo size, a placeholder until generate_photo_sizes makes it"""
+    if not photo:
+        return ''
+
+    if photo_pending(photo):
+        return static(PLACEHOLDER)
+
+    get_url = getattr(photo, 'get_%s_url' % size, None)
+    return get_url() if get_url else ''
+
+@register.filter
+def public_photos(gallery):
+    """The public photos of a gallery, with the pending ones looked up at once for photo_url"""
+    if not gallery:
+        return []
+
+    return mark_pending(gallery.public())
+
 @register.filter
 def status_text(status):
     return gettext_lazy(status)
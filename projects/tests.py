@@ -1,10 +1,92 @@
 import datetime
+import json
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+from collections import defaultdict
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
 
-from django.test import TestCase
+from django.core.management import call_command
+from django.conf import settings
+from django.db import connection
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.template.loader import render_to_string
+from django.templatetags.static import static
+from django.test import Client, TestCase, TransactionTestCase, RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 from django.urls import reverse
 
-from .models import User, Community, Project, MoneySupport, ThingSupport, ThingNecessity
+from notifications.models import Notification
+
+from rest_framework.request import Request
+
+import boto3
+from botocore.stub import Stubber
+
+from photologue.models import PhotoSize, PhotoSizeCache
+from PIL import Image
+
+from vote.models import UP, DOWN
+
+from wagtail.core.signals import page_published
+
+from home.models import HomePage
+from horodeya.context_processors import stream_token
+from horodeya.page_cache import PAGES_VERSION_KEY, get_versions
+
+from .models import load_cache_versions, User, Community, Project, ProjectStats, MoneySupport, ThingSupport, TimeSupport, ThingNecessity, TimeNecessity, NotificationJob, Announcement, BugReport, Report, Support, PhotoJob, Question, QuestionPrototype, Answer
+from .api import ProjectViewSet, ThingNecessityViewSet, MoneySupportViewSet
+from .feeds import LocalFeedBackend
+from .notifier import deliver, notify_users
+from .pagination import keyset_page
+from .photos import PLACEHOLDER, generate_sizes, prepare_upload
+from .templatetags.projects_tags import photo_url
+
+
+def create_community(admin, **kwargs):
+    fields = {'name': 'test legal entity', 'bulstat': '000', 'text': '',
+              'email': 'test@email.com', 'phone': '000', 'admin': admin}
+    fields.update(kwargs)
+    return Community.objects.create(**fields)
+
+
+def create_project(community, **kwargs):
+    fields = {'type': 'c', 'name': 'test project', 'description': '', 'text': '',
+              'community': community}
+    fields.update(kwargs)
+    return Project.objects.create(**fields)
+
+
+class ProjectFixtureMixin:
+    """A project and the community run by self.user, on an empty cache"""
+    username = 'admin'
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.user = User.objects.create(username=self.username)
+        self.community = create_community(self.user)
+        self.project = create_project(self.community)
+
+
+class TemporaryMediaMixin:
+    """Stores the uploads of each test in a directory of its own, on an empty cache"""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        media = override_settings(MEDIA_ROOT=self.media.name)
+        media.enable()
+        self.addCleanup(media.disable)
 
 
 class MoneySupportTestCase(TestCase):
@@ -66,9 +148,1381 @@ class MoneySupportTestCase(TestCase):
         self.assertQuerysetEqual(MoneySupport.objects.filter(comment='reminder from %d' % money_support.id).all(), [
                                  '<MoneySupport: Test (100.0) for test thing necessity>'])
 
+    def test_over_allocation(self):
+        """Money supports never buy more things than needed"""
+        self.money_support(200).set_accepted()
+        money_support = self.money_support(200)
+        money_support.set_accepted()
+
+        self.assertEqual(ThingSupport.objects.count(), 3)
+        self.assertQuerysetEqual(MoneySupport.objects.filter(comment='reminder from %d' % money_support.id).all(), [
+                                 '<MoneySupport: Test (100.0) for test thing necessity>'])
+
     def test_little(self):
         """When a little money support is accepted no thing support is created"""
 
         self.money_support(10).set_accepted()
 
         self.assertQuerysetEqual(ThingSupport.objects.all(), [])
+
+
+class ProjectStatsTestCase(TestCase):
+    def setUp(self):
+        admin = User.objects.create(
+            first_name="Test", second_name="Tasty", last_name="Testing")
+        community = create_community(admin)
+        self.project = create_project(community)
+        self.necessity = ThingNecessity.objects.create(
+            project=self.project,
+            name='test thing necessity',
+            description='',
+            price=100,
+            count=3,
+        )
+        self.admin = admin
+
+    def fresh_project(self):
+        return Project.objects.get(pk=self.project.pk)
+
+    def test_updated_on_support_change(self):
+        """Stats follow necessities and accepted supports"""
+        MoneySupport.objects.create(
+            leva=150, project=self.project, user=self.admin, necessity=self.necessity).set_accepted()
+
+        project = self.fresh_project()
+        self.assertEqual(project.money_needed(), 300)
+        self.assertEqual(project.money_support(), 150)
+        self.assertEqual(project.things_needed(), 3)
+        self.assertEqual(project.things_fulfilled(), 1)
+        self.assertEqual(project.money_support_percent(), 50)
+        self.assertEqual(project.total_supporters(), 1)
+
+    def test_supporters(self):
+        """A user supporting with both money and time counts once"""
+        today = timezone.now().date()
+        time = TimeNecessity.objects.create(
+            project=self.project, name='time', description='', price=10, count=2,
+            start_date=today, end_date=today)
+        other = User.objects.create(username='other')
+        for user in [self.admin, self.admin, other]:
+            MoneySupport.objects.create(leva=10, project=self.project, user=user)
+        TimeSupport.objects.create(
+            project=self.project, user=self.admin, necessity=time, price=10,
+            start_date=today, end_date=today)
+
+        self.assertEqual(self.fresh_project().total_supporters(), 2)
+
+    def test_read_only(self):
+        """New projects get their stats row, showing the stats of older ones writes nothing"""
+        self.assertTrue(ProjectStats.objects.filter(project=self.project).exists())
+
+        ProjectStats.objects.all().delete()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.fresh_project().money_needed(), 300)
+        self.assertFalse(ProjectStats.objects.exists())
+        self.assertFalse([query for query in queries if not query['sql'].startswith('SELECT')])
+
+    def test_rebuild(self):
+        """The rebuild command recreates missing stats"""
+        ProjectStats.objects.all().delete()
+        call_command('rebuild_project_stats', stdout=StringIO())
+
+        self.assertEqual(ProjectStats.objects.get(
+            project=self.project).money_needed, 300)
+
+    def test_with_stats(self):
+        """Annotated stats match the stored ones"""
+        MoneySupport.objects.create(
+            leva=150, project=self.project, user=self.admin, necessity=self.necessity).set_accepted()
+
+        with self.assertNumQueries(1):
+            project = Project.objects.with_stats().get(pk=self.project.pk)
+            self.assertEqual(project.money_needed(), 300)
+            self.assertEqual(project.money_support(), 150)
+            self.assertEqual(project.things_fulfilled(), 1)
+            self.assertEqual(project.time_support_percent(), 0)
+
+    def test_with_stats_grouping(self):
+        """Supports are counted once by the project of their necessity"""
+        other = create_project(self.project.community, name='other project')
+        for project in [self.project, other]:
+            ThingSupport.objects.create(
+                project=project, user=self.admin, necessity=self.necessity, price=100,
+                status=ThingSupport.STATUS.accepted)
+
+        project = Project.objects.with_stats().get(pk=self.project.pk)
+        self.assertEqual(project.things_fulfilled(), 2)
+
+
+class ExpireSupportsTestCase(TestCase):
+    def setUp(self):
+        admin = User.objects.create(
+            first_name="Test", second_name="Tasty", last_name="Testing")
+        community = create_community(admin)
+        project = create_project(community)
+        self.support = MoneySupport.objects.create(
+            leva=10, project=project, user=admin, status=MoneySupport.STATUS.accepted)
+
+    def test_expire(self):
+        """Supports accepted more than 30 days ago are expired and their users notified"""
+        MoneySupport.objects.filter(pk=self.support.pk).update(
+            status_since=timezone.now() - datetime.timedelta(days=31))
+
+        support = MoneySupport.objects.get(pk=self.support.pk)
+        self.assertTrue(support.expired())
+        self.assertEqual(support.status, MoneySupport.STATUS.accepted)
+
+        call_command('expire_supports', stdout=StringIO())
+
+        support = MoneySupport.objects.get(pk=self.support.pk)
+        self.assertEqual(support.status, MoneySupport.STATUS.expired)
+        self.assertEqual(support.user.notifications.count(), 1)
+
+    def test_not_expired(self):
+        """Recently accepted supports are left alone"""
+        call_command('expire_supports', stdout=StringIO())
+
+        support = MoneySupport.objects.get(pk=self.support.pk)
+        self.assertFalse(support.expired())
+        self.assertEqual(support.status, MoneySupport.STATUS.accepted)
+
+
+class NotifierTestCase(TestCase):
+    def setUp(self):
+        self.users = [User.objects.create(
+            username='user%d' % i, first_name="Test", last_name="Testing") for i in range(3)]
+
+    @override_settings(NOTIFICATIONS_SYNC=False)
+    def test_queued(self):
+        """Queued notifications are written by the worker"""
+        notify_users(self.users[0], User.objects.all(), 'test')
+        self.assertEqual(Notification.objects.count(), 0)
+
+        call_command('send_notifications', stdout=StringIO())
+
+        self.assertEqual(Notification.objects.count(), 3)
+        self.assertEqual(NotificationJob.objects.count(), 0)
+
+    @override_settings(NOTIFICATIONS_SYNC=False)
+    def test_failed_job(self):
+        """A job that fails is logged and dropped, the other jobs are delivered"""
+        notify_users(self.users[0], User.objects.all(), 'broken')
+        notify_users(self.users[0], User.objects.all(), 'test')
+
+        def fail_broken(job):
+            if job.verb == 'broken':
+                raise ValueError('bad recipients')
+            deliver(job)
+
+        with mock.patch('projects.notifier.deliver', fail_broken), \
+                self.assertLogs('projects.notifier', 'ERROR'):
+            call_command('send_notifications', stdout=StringIO())
+
+        self.assertEqual(list(Notification.objects.values_list('verb', flat=True).distinct()), ['test'])
+        self.assertEqual(NotificationJob.objects.count(), 0)
+
+    def test_sync(self):
+        """Notifications are written right away when NOTIFICATIONS_SYNC is set"""
+        notify_users(self.users[0], User.objects.all(), 'test')
+        self.assertEqual(Notification.objects.count(), 3)
+
+
+class LocalFeedTestCase(ProjectFixtureMixin, TestCase):
+    username = 'follower'
+
+    def setUp(self):
+        super().setUp()
+        self.backend = LocalFeedBackend()
+
+    def announce(self, text):
+        return Announcement.objects.create(project=self.project, text=text)
+
+    def test_fan_out(self):
+        """Activities created after following reach the follower timeline"""
+        self.backend.follow_project(self.user.id, self.project)
+        announcement = self.announce('news')
+
+        with self.assertNumQueries(1):
+            timeline, next_cursor = self.backend.user_timeline(self.user.id)
+            self.assertEqual([a.object for a in timeline], [announcement])
+        self.assertIsNone(next_cursor)
+
+    def test_backfill_and_cursor(self):
+        """Following copies earlier activities, pages continue from the cursor"""
+        announcements = [self.announce('news %d' % i) for i in range(3)]
+        self.backend.follow_project(self.user.id, self.project)
+
+        timeline, next_cursor = self.backend.user_timeline(self.user.id, limit=2)
+        self.assertEqual([a.object for a in timeline], announcements[:0:-1])
+
+        timeline, next_cursor = self.backend.user_timeline(
+            self.user.id, limit=2, before=next_cursor)
+        self.assertEqual([a.object for a in timeline], announcements[:1])
+
+    def test_feed_view(self):
+        """The public feed renders the activities of followed projects"""
+        self.backend.follow_project(0, self.project)
+        self.announce('public news')
+
+        response = self.client.get(reverse('projects:user_feed'))
+        self.assertContains(response, 'public news')
+
+    @override_settings(PAGE_SIZE=2)
+    def test_project_timeline_pages(self):
+        """The project page links to the older activities of its timeline"""
+        announcements = [self.announce('news %d' % i) for i in range(3)]
+        url = reverse('projects:details', args=[self.project.pk])
+
+        response = self.client.get(url)
+        self.assertNotContains(response, 'news 0')
+        next_cursor = response.context['next_cursor']
+        self.assertContains(response, '?before=%s' % next_cursor)
+
+        response = self.client.get(url, {'before': next_cursor})
+        self.assertContains(response, 'news 0')
+        self.assertEqual([a.object for a in response.context['timeline']], announcements[:1])
+
+    def test_import_stream_follows(self):
+        """The projects users follow on Stream are followed locally, with their backfill"""
+        self.announce('news')
+        feed = mock.Mock()
+        feed.following.return_value = {'results': [
+            {'target_id': 'project:%d' % self.project.pk}, {'target_id': 'user:1'}]}
+
+        # stream_django.feed_manager is the manager itself, not its module
+        with mock.patch('stream_django.feed_manager.get_notification_feed', return_value=feed):
+            call_command('import_stream_follows', stdout=StringIO())
+
+        timeline, next_cursor = self.backend.user_timeline(self.user.id)
+        self.assertEqual([a.object.text for a in timeline], ['news'])
+
+    def test_feed_view_bad_cursor(self):
+        """A cursor that is not a number starts from the latest activities"""
+        self.backend.follow_project(0, self.project)
+        self.announce('public news')
+
+        response = self.client.get(reverse('projects:user_feed') + '?before=abc')
+        self.assertContains(response, 'public news')
+
+    def test_unseen_badge(self):
+        """The notification badge counts local activities without the Stream client"""
+        self.backend.follow_project(self.user.id, self.project)
+        self.announce('news')
+        self.announce('more news')
+        self.client.force_login(self.user)
+
+        response = self.client.get(reverse('projects:user_feed'))
+        self.assertContains(response, 'updateNotificationCounter(2);')
+        self.assertNotContains(response, 'getstream.js')
+        self.assertNotIn('stream_token', response.context)
+
+        self.backend.notifications(self.user.id)
+        self.assertEqual(self.backend.unseen_count(self.user.id), 0)
+
+
+class StreamTokenTestCase(TestCase):
+    @override_settings(FEED_BACKEND='projects.feeds.StreamFeedBackend')
+    def test_lazy(self):
+        """The token is not generated unless a template uses it"""
+        user = User.objects.create(username='user')
+        request = RequestFactory().get('/')
+        request.user = user
+
+        with mock.patch('horodeya.context_processors.get_stream_token') as get_token:
+            context = stream_token(request)
+            get_token.assert_not_called()
+
+            get_token.return_value = 'token'
+            self.assertEqual(str(context['stream_token']), 'token')
+            get_token.assert_called_once_with(user)
+
+
+class CommunityMembershipTestCase(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create(username='admin')
+        self.member = User.objects.create(username='member')
+        self.community = create_community(self.admin)
+        self.member.communities.add(self.community)
+        self.project = create_project(self.community)
+
+    def test_single_query(self):
+        """Permission checks load the memberships once"""
+        member = User.objects.get(pk=self.member.pk)
+        with self.assertNumQueries(1):
+            self.assertTrue(member.has_perm('projects.add_report', self.project))
+            self.assertTrue(member.has_perm(
+                'projects.change_timenecessity', self.project))
+            self.assertFalse(member.has_perm(
+                'projects.delete_project', self.project))
+
+    def test_admin_without_membership(self):
+        """The admin keeps admin rights when not a member"""
+        admin = User.objects.get(pk=self.admin.pk)
+        self.assertFalse(admin.member_of(self.community.pk))
+        self.assertTrue(admin.has_perm(
+            'projects.delete_project', self.project))
+
+    def test_forget(self):
+        """Memberships are loaded again after being forgotten"""
+        member = User.objects.get(pk=self.member.pk)
+        self.assertTrue(member.member_of(self.community.pk))
+
+        member.communities.remove(self.community)
+        member.forget_communities()
+        self.assertFalse(member.member_of(self.community.pk))
+
+    def test_anonymous(self):
+        """Anonymous users are sent to sign in instead of checked for membership"""
+        for url in [reverse('projects:delete', args=[self.project.pk]),
+                    reverse('projects:community_update', args=[self.community.pk])]:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 302)
+                self.assertTrue(response.url.startswith(settings.LOGIN_URL))
+
+    def test_account(self):
+        """The account page lists the accepted projects of the user's communities"""
+        other = create_community(self.admin, name='other legal entity', bulstat='001')
+        create_project(other, name='other project', verified_status='accepted')
+        self.project.verified_status = 'accepted'
+        self.project.save()
+        MoneySupport.objects.create(
+            leva=10, project=self.project, user=self.member)
+
+        self.client.force_login(self.member)
+        response = self.client.get(reverse('account', args=[self.member.pk]))
+        self.assertEqual(list(response.context['object'].projects), [self.project])
+        self.assertEqual(response.context['object'].money_support_count, 1)
+        self.assertEqual(response.context['object'].time_support_count, 0)
+        self.assertEqual(response.context['object'].votes_count, 0)
+
+
+@override_settings(PAGE_SIZE=2)
+class KeysetPaginationTestCase(TestCase):
+    def setUp(self):
+        now = timezone.now()
+        self.reports = [BugReport.objects.create(
+            email='test@email.com', message=str(i), created_at=now) for i in range(5)]
+        self.reports.reverse()
+
+    def test_pages(self):
+        """Pages follow each other without gaps when the timestamps are equal"""
+        page, cursor = keyset_page(BugReport.objects.all())
+        self.assertEqual(page, self.reports[:2])
+
+        page, cursor = keyset_page(BugReport.objects.all(), cursor)
+        self.assertEqual(page, self.reports[2:4])
+
+        page, cursor = keyset_page(BugReport.objects.all(), cursor)
+        self.assertEqual(page, self.reports[4:])
+        self.assertIsNone(cursor)
+
+    def test_view(self):
+        """The list views link to the next page"""
+        admin = User.objects.create(username='admin', is_superuser=True)
+        self.client.force_login(admin)
+        response = self.client.get(reverse('projects:bugreport_list'))
+        self.assertEqual(response.context['next_cursor'], self.reports[1].pk)
+
+        response = self.client.get(
+            reverse('projects:bugreport_list'), {'before': self.reports[1].pk})
+        self.assertEqual(response.context['reports'], self.reports[2:4])
+
+    def test_list_view(self):
+        """ListViews with KeysetPaginationMixin page their object_list"""
+        admin = User.objects.create(username='admin')
+        self.client.force_login(admin)
+        communities = [create_community(admin, name=str(i)) for i in range(3)]
+        communities.reverse()
+
+        response = self.client.get(reverse('projects:community_list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context['object_list']), communities[:2])
+        self.assertEqual(response.context['next_cursor'], communities[1].pk)
+
+
+class QueryPlanMixin:
+    def assertIndexed(self, queryset):
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+            plan = queryset.explain()
+            self.assertNotIn('Seq Scan', plan, plan)
+        else:
+            plan = queryset.explain()
+            for line in plan.splitlines():
+                self.assertFalse(' SCAN ' in line and 'USING' not in line, plan)
+
+
+class QueryPlanTestCase(QueryPlanMixin, TestCase):
+    def setUp(self):
+        self.admin = User.objects.create(username='admin')
+        for i in range(5):
+            community = create_community(self.admin, name='community %d' % i, bulstat=str(i))
+            project = create_project(community, name='project %d' % i, verified_status='accepted')
+            thing = ThingNecessity.objects.create(
+                project=project, name='thing', description='', count=10, price=10)
+            today = timezone.now().date()
+            time = TimeNecessity.objects.create(
+                project=project, name='time', description='', count=10, price=10,
+                start_date=today, end_date=today)
+            for j in range(5):
+                user = User.objects.create(username='user %d %d' % (i, j))
+                MoneySupport.objects.create(
+                    leva=10, project=project, user=user, necessity=thing)
+                ThingSupport.objects.create(
+                    project=project, user=user, necessity=thing, price=10)
+                TimeSupport.objects.create(
+                    project=project, user=user, necessity=time, price=10,
+                    start_date=today, end_date=today)
+                Report.objects.create(
+                    project=project, name='report', text='', published_at=timezone.now())
+
+        self.project = project
+        self.thing = thing
+        self.time = time
+        self.user = user
+
+    def test_indexes(self):
+        """The hot filter and order paths do not scan the whole table"""
+        now = timezone.now()
+        accepted = Support.STATUS.accepted
+
+        for queryset in [
+            MoneySupport.objects.filter(
+                project=self.project, status__in=[accepted, Support.STATUS.delivered]),
+            MoneySupport.objects.filter(necessity=self.thing, status=accepted),
+            ThingSupport.objects.filter(necessity=self.thing, status=accepted),
+            TimeSupport.objects.filter(necessity=self.time, status=accepted),
+            TimeSupport.objects.filter(project=self.project, status=accepted),
+            TimeSupport.objects.filter(necessity__project=self.project, status=accepted),
+            self.project.recent_money_support(),
+            self.project.recent_time_support(),
+            self.user.moneysupport_set.order_by('-status_since', '-id'),
+            self.user.timesupport_set.order_by('-status_since', '-id'),
+            TimeSupport.objects.filter(status=accepted, status_since__lt=now),
+            Report.objects.filter(project=self.project, published_at__lte=now).order_by(
+                '-published_at', '-id'),
+            Project.objects.filter(verified_status='accepted',
+                                   community=self.project.community_id),
+            Project.objects.filter(verified_status='review').order_by('-created_at', '-id'),
+        ]:
+            self.assertIndexed(queryset)
+
+
+class BenchmarkTestCase(TestCase):
+    def test_seed_and_run(self):
+        """The benchmark runs on a small seeded dataset and reports every endpoint"""
+        call_command('seed_benchmark', communities=3, projects_per_community=2,
+                     users=10, stdout=StringIO())
+        self.assertEqual(Project.objects.count(), 6)
+        accepted = MoneySupport.objects.filter(status=Support.STATUS.accepted).count()
+
+        out = StringIO()
+        call_command('run_benchmark', runs=2, stdout=out)
+        results = json.loads(out.getvalue())
+
+        self.assertEqual(set(results), {
+            'project_details', 'community_details', 'account', 'user_vote_list',
+            'list', 'support_change_accept', 'money_matching'})
+        self.assertEqual(results['account']['runs'], 2)
+        self.assertIn('p95_ms', results['money_matching'])
+        self.assertEqual(MoneySupport.objects.filter(
+            status=Support.STATUS.accepted).count(), accepted)
+
+
+class QueryRecorder:
+    """Records the executed SQL with the code that caused it"""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries.append((sql, self.call_site()))
+        return execute(sql, params, many, context)
+
+    def call_site(self):
+        """The innermost project code and template line on the stack"""
+        code = None
+        template = None
+        sites = []
+        frame = sys._getframe(2)
+
+        while frame and not (code and template):
+            filename = frame.f_code.co_filename
+            if template is None and frame.f_code.co_name == 'render_annotated':
+                node = frame.f_locals.get('self')
+                if getattr(node, 'token', None) and getattr(node, 'origin', None):
+                    template = '%s:%d' % (node.origin.template_name, node.token.lineno)
+                    sites.append(template)
+            elif code is None and filename.startswith(settings.BASE_DIR) \
+                    and not filename.startswith(os.path.join(settings.BASE_DIR, 'venv')) \
+                    and filename != __file__:
+                code = '%s:%d in %s' % (os.path.relpath(filename, settings.BASE_DIR),
+                                        frame.f_lineno, frame.f_code.co_name)
+                sites.append(code)
+            frame = frame.f_back
+
+        return ' from '.join(sites) or 'unknown'
+
+    def report(self):
+        sites = defaultdict(list)
+        for sql, site in self.queries:
+            sites[site].append(sql)
+
+        lines = []
+        for site, queries in sorted(sites.items(), key=lambda item: -len(item[1])):
+            lines.append('%4d x %s' % (len(queries), site))
+            lines.append('         %s' % queries[0])
+
+        return '\n'.join(lines)
+
+
+class QueryBudgetTestCase(TestCase):
+    """
+    Renders the pages against a few rows of everything and fails when one
+    of them needs more queries than its budget, which usually means a
+    template started calling a query per row.
+    """
+
+    # url name, arguments, query budget
+    BUDGETS = [
+        ('projects:details', lambda t: [t.project.pk], 18),
+        ('projects:community_details', lambda t: [t.community.pk], 12),
+        ('projects:community_list', lambda t: [], 6),
+        ('projects:community_member_list', lambda t: [t.community.pk], 8),
+        ('projects:report_list', lambda t: [t.project.pk], 12),
+        ('projects:report_details', lambda t: [t.report.pk], 11),
+        ('projects:money_support_details', lambda t: [t.money_support.pk], 12),
+        ('projects:time_support_details', lambda t: [t.time_support.pk], 12),
+        ('projects:user_support_list', lambda t: [t.member.pk, 'money'], 7),
+        ('projects:user_support_list', lambda t: [t.member.pk, 'time'], 7),
+        ('projects:user_vote_list', lambda t: [t.member.pk], 9),
+        ('projects:time_necessity_list', lambda t: [t.project.pk], 12),
+        ('projects:thing_necessity_list', lambda t: [t.project.pk], 12),
+        ('projects:time_necessity_details', lambda t: [t.time.pk], 14),
+        ('projects:thing_necessity_details', lambda t: [t.thing.pk], 17),
+        ('projects:money_support_update', lambda t: [t.money_support.pk], 12),
+        ('projects:time_support_create', lambda t: [t.project.pk], 12),
+        ('projects:user_feed', lambda t: [], 6),
+        ('projects:user_notifications', lambda t: [], 8),
+        ('projects:user_read_notifications', lambda t: [], 7),
+        ('projects:unverified_cause_list', lambda t: [], 6),
+        ('projects:administration', lambda t: [], 5),
+        ('projects:bugreport_list', lambda t: [], 6),
+        ('my_account', lambda t: [], 8),
+        ('account', lambda t: [t.member.pk], 8),
+        ('notifications', lambda t: [], 5),
+    ]
+
+    def setUp(self):
+        cache.clear()
+        call_command('seed_benchmark', communities=2, projects_per_community=3,
+                     users=6, stdout=StringIO())
+        self.project = Project.objects.filter(verified_status='accepted').order_by('pk').first()
+        self.community = self.project.community
+        self.member = self.community.admin
+        self.member.is_superuser = True
+        self.member.save()
+        self.report = self.project.report_set.first()
+        self.money_support = self.project.moneysupport_set.first()
+        self.time_support = self.project.timesupport_set.first()
+        self.time = self.project.timenecessity_set.first()
+        self.thing = self.project.thingnecessity_set.first()
+
+        # A few rows on every list so that a query per row shows up
+        for thing in ThingNecessity.objects.all()[:3]:
+            MoneySupport.objects.create(
+                leva=10, project=thing.project, user=self.member, necessity=thing)
+        for time in TimeNecessity.objects.exclude(supports__user=self.member)[:3]:
+            TimeSupport.objects.create(
+                project=time.project, user=self.member, necessity=time, price=10,
+                start_date=time.start_date, end_date=time.end_date)
+        for project in Project.objects.all()[:3]:
+            LocalFeedBackend().follow_project(self.member.pk, project)
+
+    def test_budgets(self):
+        """Every page stays within its query budget"""
+        self.client.force_login(self.member)
+
+        for name, args, budget in self.BUDGETS:
+            url = reverse(name, args=args(self))
+            recorder = QueryRecorder()
+            with connection.execute_wrapper(recorder):
+                response = self.client.get(url)
+
+            with self.subTest(url=url):
+                self.assertEqual(response.status_code, 200)
+                if len(recorder.queries) > budget:
+                    self.fail('%s made %d queries, the budget is %d\n%s' % (
+                        url, len(recorder.queries), budget, recorder.report()))
+
+
+class RequestTimingTestCase(TestCase):
+    @override_settings(REQUEST_TIMING_SAMPLE_RATE=1, REQUEST_TIMING_HEADER=False)
+    def test_sampled(self):
+        """Sampled requests are logged and staff get a Server-Timing header"""
+        self.client.force_login(User.objects.create(username='user', is_staff=True))
+        with self.assertLogs('horodeya.timing') as logs:
+            response = self.client.get(reverse('projects:community_list'))
+
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['url_name'], 'projects:community_list')
+        self.assertEqual(record['status'], 200)
+        self.assertGreater(record['queries'], 0)
+        self.assertIn('template_ms', record)
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.assertIn('total;dur=', response['Server-Timing'])
+
+    @override_settings(REQUEST_TIMING_SAMPLE_RATE=1, REQUEST_TIMING_HEADER=False)
+    def test_no_header(self):
+        """Other users are measured without seeing the timings"""
+        with self.assertLogs('horodeya.timing'):
+            response = self.client.get(reverse('projects:community_list'))
+        self.assertFalse(response.has_header('Server-Timing'))
+
+    @override_settings(REQUEST_TIMING_SAMPLE_RATE=0)
+    def test_not_sampled(self):
+        """Requests outside the sample are not measured"""
+        response = self.client.get(reverse('projects:community_list'))
+        self.assertFalse(response.has_header('Server-Timing'))
+
+
+class FragmentCacheTestCase(ProjectFixtureMixin, TransactionTestCase):
+    def setUp(self):
+        super().setUp()
+        self.necessity = ThingNecessity.objects.create(
+            project=self.project, name='thing', description='', price=100, count=2)
+
+    def render(self):
+        project = Project.objects.get(pk=self.project.pk)
+        return render_to_string('projects/project_stats.html', {'project': project, 'short': True})
+
+    def test_cached(self):
+        """The stats are rendered once until the project changes"""
+        first = self.render()
+
+        project = Project.objects.get(pk=self.project.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(render_to_string(
+                'projects/project_stats.html', {'project': project, 'short': True}), first)
+
+    def test_versions_loaded_at_once(self):
+        """A page of projects gets the versions of its fragments with one cache request"""
+        projects = [self.project] + [create_project(self.community, name=str(i)) for i in range(2)]
+        expected = [project.cache_version() for project in projects]
+
+        with mock.patch('projects.models.get_versions', wraps=get_versions) as versions:
+            load_cache_versions(projects)
+            self.assertEqual([project.cache_version() for project in projects], expected)
+
+        versions.assert_called_once()
+
+    def test_support_invalidates(self):
+        """Accepting a support bumps the project version"""
+        version = self.project.cache_version()
+        first = self.render()
+
+        MoneySupport.objects.create(
+            leva=100, project=self.project, user=self.user, necessity=self.necessity).set_accepted()
+
+        self.assertNotEqual(self.project.cache_version(), version)
+        self.assertNotEqual(self.render(), first)
+
+    def test_expire_invalidates(self):
+        """Expiring supports bumps the project version"""
+        MoneySupport.objects.create(
+            leva=100, project=self.project, user=self.user, status=MoneySupport.STATUS.accepted)
+        MoneySupport.objects.update(status_since=timezone.now() - datetime.timedelta(days=31))
+        version = self.project.cache_version()
+
+        call_command('expire_supports', stdout=StringIO())
+
+        self.assertNotEqual(self.project.cache_version(), version)
+
+
+@override_settings(PAGE_CACHE_TIMEOUT=3600)
+class PageCacheTestCase(ProjectFixtureMixin, TransactionTestCase):
+    def setUp(self):
+        super().setUp()
+        self.necessity = ThingNecessity.objects.create(
+            project=self.project, name='thing', description='', price=100, count=2)
+        self.url = reverse('projects:details', args=[self.project.pk])
+
+    def test_anonymous_cached(self):
+        """The second anonymous request is served from the cache"""
+        first = self.client.get(self.url)
+        self.assertEqual(first.status_code, 200)
+        self.assertIn('ETag', first)
+        self.assertIn('Last-Modified', first)
+
+        with CaptureQueriesContext(connection) as queries:
+            second = self.client.get(self.url)
+        self.assertEqual(second['ETag'], first['ETag'])
+        # Only the Wagtail site middleware and the permission check query
+        self.assertLessEqual(len(queries), 2)
+        self.assertContains(second, 'test project')
+
+    def test_not_modified(self):
+        """A request with the current ETag gets an empty 304"""
+        etag = self.client.get(self.url)['ETag']
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+    def test_logged_in_bypass(self):
+        """Logged in users always get a freshly rendered page"""
+        self.client.force_login(self.user)
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('ETag', response)
+
+    def test_support_purges(self):
+        """Accepting a support purges the cached project page"""
+        etag = self.client.get(self.url)['ETag']
+
+        MoneySupport.objects.create(
+            leva=100, project=self.project, user=self.user, necessity=self.necessity).set_accepted()
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_page_published_purges(self):
+        """Publishing a Wagtail page purges the cached Wagtail pages"""
+        version = get_versions([PAGES_VERSION_KEY])
+
+        page_published.send(sender=HomePage, instance=None, revision=None)
+
+        self.assertNotEqual(get_versions([PAGES_VERSION_KEY]), version)
+
+    def test_csrf_token(self):
+        """A cached page carries the CSRF token of the visitor it is served to"""
+        self.client.get(self.url)
+
+        client = Client(enforce_csrf_checks=True)
+        response = client.get(self.url)
+        token = re.search(
+            r'name="csrfmiddlewaretoken" value="([^"]*)"', response.content.decode()).group(1)
+
+        response = client.post(reverse('set_language'), {
+            'csrfmiddlewaretoken': token, 'language': 'en', 'next': '/'})
+        self.assertEqual(response.status_code, 302)
+
+
+class ApiTestCase(QueryPlanMixin, TestCase):
+    def setUp(self):
+        self.admin = User.objects.create(username='admin', first_name='Admin', last_name='Adminov')
+        self.community = create_community(self.admin)
+        self.project = self.add_project('accepted')
+        self.hidden = self.add_project('review')
+
+    def add_project(self, verified_status):
+        project = create_project(
+            self.community, name='project %s' % verified_status, verified_status=verified_status)
+        thing = ThingNecessity.objects.create(
+            project=project, name='thing', description='', price=100, count=2)
+        today = timezone.now().date()
+        time = TimeNecessity.objects.create(
+            project=project, name='time', description='', price=10, count=2,
+            start_date=today, end_date=today)
+        MoneySupport.objects.create(
+            leva=100, project=project, user=self.admin, necessity=thing,
+            status=Support.STATUS.accepted)
+        MoneySupport.objects.create(
+            leva=100, project=project, user=self.admin, necessity=thing,
+            status=Support.STATUS.accepted, anonymous=True)
+        MoneySupport.objects.create(
+            leva=100, project=project, user=self.admin, necessity=thing)
+        TimeSupport.objects.create(
+            project=project, user=self.admin, necessity=time, price=10,
+            start_date=today, end_date=today, status=Support.STATUS.accepted)
+        return project
+
+    def test_projects(self):
+        """Only accepted projects are listed, with their stats"""
+        response = self.client.get(reverse('api:project-list'))
+        self.assertEqual(response.status_code, 200)
+
+        results = response.json()['results']
+        self.assertEqual([project['id'] for project in results], [self.project.pk])
+        self.assertEqual(results[0]['community_name'], 'test legal entity')
+        self.assertEqual(results[0]['money_needed'], 200)
+        self.assertEqual(results[0]['money_collected'], 200)
+
+        response = self.client.get(reverse('api:project-detail', args=[self.hidden.pk]))
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(PAGE_SIZE=1)
+    def test_cursor(self):
+        """The next link pages past the last row"""
+        create_community(self.admin, name='second', bulstat='001')
+
+        first = self.client.get(reverse('api:community-list')).json()
+        self.assertEqual([c['name'] for c in first['results']], ['second'])
+
+        second = self.client.get(first['next']).json()
+        self.assertEqual([c['name'] for c in second['results']], ['test legal entity'])
+        self.assertIsNone(second['next'])
+
+    def test_fields(self):
+        """?fields= leaves out the other fields and the unneeded stats subqueries"""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('api:project-list'), {'fields': 'id,name'})
+
+        self.assertEqual(response.json()['results'], [{'id': self.project.pk, 'name': 'project accepted'}])
+        self.assertFalse(any('SUM(' in query['sql'].upper() for query in queries))
+
+    def test_not_modified(self):
+        """A request with the current ETag gets an empty 304"""
+        url = reverse('api:project-detail', args=[self.project.pk])
+        etag = self.client.get(url)['ETag']
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+        Project.objects.filter(pk=self.project.pk).update(name='renamed')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_public_supports(self):
+        """Supports in review are not listed and anonymous ones hide the user"""
+        results = self.client.get(reverse('api:moneysupport-list'), {'project': self.project.pk}).json()['results']
+
+        self.assertEqual(sorted([support['user'] for support in results], key=str),
+                         [self.admin.pk, None])
+        self.assertIn('Admin Adminov', [support['user_name'] for support in results])
+
+    def test_constant_queries(self):
+        """A page costs the same number of queries however many rows it has"""
+        urls = [reverse('api:%s-list' % name) for name in [
+            'community', 'project', 'thingnecessity', 'timenecessity', 'moneysupport', 'timesupport']]
+
+        counts = {}
+        for url in urls:
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(url)
+            counts[url] = len(queries)
+
+        for i in range(3):
+            self.add_project('accepted')
+
+        for url in urls:
+            with self.assertNumQueries(counts[url]):
+                self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_query_plans(self):
+        """The list pages are read through indexes"""
+        for viewset in [ProjectViewSet, ThingNecessityViewSet, MoneySupportViewSet]:
+            view = viewset(request=Request(RequestFactory().get('/', {'project': self.project.pk})))
+            self.assertIndexed(
+                view.get_queryset().order_by(*view.keyset_ordering)[:settings.PAGE_SIZE + 1])
+
+
+@override_settings(PHOTO_SIZES_SYNC=False, PHOTO_MAX_SIZE=100)
+class PhotoUploadTestCase(TemporaryMediaMixin, ProjectFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        PhotoSize.objects.update_or_create(
+            name='thumbnail', defaults={'width': 20, 'height': 20, 'crop': True})
+        self.addCleanup(PhotoSizeCache().reset)
+        PhotoSizeCache().reset()
+
+    def upload(self, name='photo.jpg', size=(300, 150), exif=None):
+        buffer = BytesIO()
+        Image.new('RGB', size, 'red').save(buffer, 'JPEG', exif=exif or b'')
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg')
+
+    def test_prepare_upload(self):
+        """Uploads are rotated as their EXIF says, downscaled and stripped of EXIF"""
+        exif = Image.Exif()
+        exif[0x0112] = 6  # rotated 90 degrees
+        exif[0x010f] = 'Camera maker'
+
+        prepared = Image.open(prepare_upload(self.upload(exif=exif.tobytes())))
+
+        self.assertEqual(prepared.size, (50, 100))
+        self.assertNotIn('exif', prepared.info)
+
+    def test_gallery_upload_queued(self):
+        """Gallery uploads are queued and show a placeholder until their sizes exist"""
+        response = self.client.post(reverse('projects:gallery_update', args=[self.project.pk]), {
+            'form-TOTAL_FORMS': '1',
+            'form-INITIAL_FORMS': '0',
+            'form-0-image': self.upload(),
+        })
+        self.assertEqual(response.status_code, 302)
+
+        photo = Project.objects.get(pk=self.project.pk).gallery.photos.get()
+        self.assertTrue(PhotoJob.objects.filter(photo=photo).exists())
+        self.assertFalse(photo.size_exists(PhotoSizeCache().sizes['thumbnail']))
+        self.assertEqual(photo_url(photo, 'thumbnail'), static(PLACEHOLDER))
+
+        call_command('generate_photo_sizes', stdout=StringIO())
+
+        self.assertFalse(PhotoJob.objects.exists())
+        photo = Project.objects.get(pk=self.project.pk).gallery.photos.get()
+        self.assertTrue(photo.size_exists(PhotoSizeCache().sizes['thumbnail']))
+        self.assertEqual(photo_url(photo, 'thumbnail'), photo.get_thumbnail_url())
+
+    def test_failed_job(self):
+        """A photo whose sizes fail is logged and dropped, the rest of the queue is generated"""
+        for i in range(2):
+            self.client.post(reverse('projects:gallery_update', args=[self.project.pk]), {
+                'form-TOTAL_FORMS': '1',
+                'form-INITIAL_FORMS': '0',
+                'form-0-image': self.upload(name='photo%d.jpg' % i),
+            })
+        broken, photo = PhotoJob.objects.order_by('pk').values_list('photo_id', flat=True)
+
+        def fail_broken(photo):
+            if photo.pk == broken:
+                raise OSError('truncated')
+            generate_sizes(photo)
+
+        with mock.patch('projects.photos.generate_sizes', fail_broken), \
+                self.assertLogs('projects.photos', 'ERROR'):
+            call_command('generate_photo_sizes', stdout=StringIO())
+
+        self.assertFalse(PhotoJob.objects.exists())
+        photo = Project.objects.get(pk=self.project.pk).gallery.photos.get(pk=photo)
+        self.assertTrue(photo.size_exists(PhotoSizeCache().sizes['thumbnail']))
+
+    def reorder_gallery(self):
+        """Posts the gallery editor with its photos in reverse order, returns the queries it took"""
+        gallery = Project.objects.get(pk=self.project.pk).gallery
+        photos = list(gallery.photos.all())
+        data = {
+            'form-TOTAL_FORMS': str(len(photos) + 1),
+            'form-INITIAL_FORMS': str(len(photos)),
+        }
+        for i, photo in enumerate(photos):
+            data['form-%d-id' % i] = photo.pk
+            data['form-%d-ORDER' % i] = len(photos) - i
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                reverse('projects:gallery_update', args=[self.project.pk]), data)
+        self.assertEqual(response.status_code, 302)
+
+        self.assertEqual(list(gallery.photos.all()), photos[::-1])
+        return len(queries)
+
+    def test_gallery_reorder_queries(self):
+        """Reordering the gallery takes the same queries however many photos it has"""
+        def add_photos(count):
+            for i in range(count):
+                self.client.post(reverse('projects:gallery_update', args=[self.project.pk]), {
+                    'form-TOTAL_FORMS': '1',
+                    'form-INITIAL_FORMS': '0',
+                    'form-0-image': self.upload(),
+                })
+
+        add_photos(3)
+        small = self.reorder_gallery()
+        add_photos(27)
+
+        self.assertEqual(self.reorder_gallery(), small)
+
+    def test_gallery_pending_queries(self):
+        """The gallery and its editor look up the pending photos with one query"""
+        def count_queries(name):
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(reverse(name, args=[self.project.pk]))
+            self.assertContains(response, static(PLACEHOLDER))
+            return len(queries)
+
+        def add_photos(count):
+            for i in range(count):
+                self.client.post(reverse('projects:gallery_update', args=[self.project.pk]), {
+                    'form-TOTAL_FORMS': '1',
+                    'form-INITIAL_FORMS': '0',
+                    'form-0-image': self.upload(),
+                })
+
+        add_photos(2)
+        small = {name: count_queries(name) for name in ['projects:details', 'projects:gallery_update']}
+        add_photos(3)
+
+        for name, queries in small.items():
+            self.assertEqual(count_queries(name), queries)
+
+    def test_user_photo(self):
+        """The profile photo is queued as well"""
+        self.client.force_login(self.user)
+        self.client.post(reverse('projects:user_photo_update', args=[self.user.pk]), {
+            'file': self.upload(),
+        })
+
+        photo = User.objects.get(pk=self.user.pk).photo
+        self.assertEqual(Image.open(photo.image).size, (100, 50))
+        self.assertTrue(PhotoJob.objects.filter(photo=photo).exists())
+
+
+@override_settings(AWS_ACCESS_KEY_ID='test', AWS_SECRET_ACCESS_KEY='test', AWS_DEFAULT_REGION='eu-west-1',
+                   AWS_S3_ENDPOINT_URL='http://localhost:9000', PHOTO_SIZES_SYNC=False)
+class DirectUploadTestCase(TemporaryMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create(username='user')
+        self.client.force_login(self.user)
+        self.name = 'user/%d/abcd1234.jpg' % self.user.pk
+
+        self.s3 = boto3.client('s3', region_name='eu-west-1', aws_access_key_id='test',
+                               aws_secret_access_key='test', endpoint_url='http://localhost:9000')
+        self.stubber = Stubber(self.s3)
+        patcher = mock.patch('projects.uploads.s3_client', return_value=self.s3)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def start(self, content_type='image/jpeg', pk=None):
+        return self.client.post(reverse('projects:photo_upload_start', args=['user', pk or self.user.pk]), {
+            'filename': 'Photo.JPG', 'content_type': content_type})
+
+    def finish(self, name=None):
+        with self.stubber:
+            return self.client.post(reverse('projects:photo_upload_finish', args=['user', self.user.pk]), {
+                'name': name or self.name})
+
+    def expect_head(self, length=1000, content_type='image/jpeg'):
+        self.stubber.add_response('head_object', {'ContentLength': length, 'ContentType': content_type}, {
+            'Bucket': settings.AWS_STORAGE_BUCKET_NAME, 'Key': 'media/' + self.name})
+
+    def test_presign(self):
+        """The browser gets a presigned POST for a key in the user's directory"""
+        upload = self.start().json()
+
+        self.assertTrue(upload['url'].startswith('http://localhost:9000'))
+        self.assertRegex(upload['name'], r'^user/%d/\w+\.jpg$' % self.user.pk)
+        self.assertEqual(upload['fields']['key'], 'media/' + upload['name'])
+        self.assertEqual(upload['fields']['Content-Type'], 'image/jpeg')
+        self.assertIn('policy', upload['fields'])
+
+    def test_presign_checks(self):
+        """Only images and only for the user's own photo"""
+        self.assertEqual(self.start(content_type='text/html').status_code, 400)
+
+        other = User.objects.create(username='other')
+        self.assertEqual(self.start(pk=other.pk).status_code, 403)
+
+    def test_finish(self):
+        """A finished upload becomes the user's photo without passing through the server"""
+        self.expect_head()
+
+        response = self.finish()
+        self.assertEqual(response.json()['redirect'], self.user.get_absolute_url())
+
+        photo = User.objects.get(pk=self.user.pk).photo
+        self.assertEqual(photo.image.name, self.name)
+        self.assertTrue(PhotoJob.objects.get(photo=photo).prepare)
+
+    def test_finish_checks(self):
+        """Uploads outside the directory, too large or of another type are refused"""
+        self.assertEqual(self.finish(name='user/0/abcd1234.jpg').status_code, 400)
+        self.assertEqual(self.finish(name='user/%d/../0/abcd1234.jpg' % self.user.pk).status_code, 400)
+
+        self.expect_head(length=settings.PHOTO_UPLOAD_MAX_BYTES + 1)
+        self.stubber.add_response('delete_object', {}, {
+            'Bucket': settings.AWS_STORAGE_BUCKET_NAME, 'Key': 'media/' + self.name})
+        self.assertEqual(self.finish().status_code, 400)
+
+        self.assertIsNone(User.objects.get(pk=self.user.pk).photo)
+
+    @override_settings(PHOTO_MAX_SIZE=100)
+    def test_worker_prepares(self):
+        """The worker downscales direct uploads and drops the ones which are not images"""
+        buffer = BytesIO()
+        Image.new('RGB', (300, 150), 'red').save(buffer, 'JPEG')
+        default_storage.save(self.name, ContentFile(buffer.getvalue()))
+        self.expect_head()
+        self.finish()
+
+        call_command('generate_photo_sizes', stdout=StringIO())
+        self.assertEqual(Image.open(default_storage.open(self.name)).size, (100, 50))
+
+        self.name = 'user/%d/efgh5678.jpg' % self.user.pk
+        default_storage.save(self.name, ContentFile(b'<html>'))
+        self.expect_head()
+        self.finish()
+
+        call_command('generate_photo_sizes', stdout=StringIO())
+        self.assertFalse(default_storage.exists(self.name))
+        self.assertIsNone(User.objects.get(pk=self.user.pk).photo)
+        self.assertFalse(PhotoJob.objects.exists())
+
+
+class NecessityUpdateTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='admin', is_superuser=True)
+        self.client.force_login(self.user)
+        self.community = create_community(self.user)
+        for order, text in enumerate(['first', 'second', 'third'], 1):
+            QuestionPrototype.objects.create(
+                text_bg=text, text_en=text, type='CharField', order=order)
+
+    def post(self, project, rows):
+        data = {
+            'thingnecessity_set-TOTAL_FORMS': str(rows),
+            'thingnecessity_set-INITIAL_FORMS': '0',
+        }
+        for i in range(rows):
+            data.update({
+                'thingnecessity_set-%d-name' % i: 'thing %d' % i,
+                'thingnecessity_set-%d-description' % i: 'description',
+                'thingnecessity_set-%d-count' % i: '2',
+                'thingnecessity_set-%d-price' % i: '10',
+            })
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                reverse('projects:thing_necessity_update', args=[project.pk]), data)
+        self.assertEqual(response.status_code, 302)
+        return len(queries)
+
+    def test_queries(self):
+        """Saving the formset takes the same queries however many rows it has"""
+        small = self.post(create_project(self.community), 2)
+        project = create_project(self.community)
+
+        self.assertEqual(self.post(project, 20), small)
+        self.assertEqual(project.thingnecessity_set.count(), 20)
+        self.assertEqual(ProjectStats.objects.get(project=project).things_needed, 40)
+
+    def test_default_questions(self):
+        """The first necessities add the default questions, once"""
+        project = create_project(self.community)
+        self.post(project, 2)
+        self.post(project, 1)
+
+        questions = Question.objects.filter(project=project).order_by('order')
+        self.assertEqual([(question.order, str(question.prototype)) for question in questions],
+                         [(1, 'first'), (2, 'second'), (3, 'third')])
+
+        questions[0].delete()
+        project.add_default_questions()
+        self.assertEqual(project.question_set.count(), 2)
+
+    def test_update_rows(self):
+        """Changed rows are updated and deleted rows removed"""
+        project = create_project(self.community)
+        self.post(project, 2)
+        first, second = project.thingnecessity_set.order_by('pk')
+
+        data = {
+            'thingnecessity_set-TOTAL_FORMS': '2',
+            'thingnecessity_set-INITIAL_FORMS': '2',
+        }
+        for i, thing in enumerate([first, second]):
+            data.update({
+                'thingnecessity_set-%d-id' % i: thing.pk,
+                'thingnecessity_set-%d-name' % i: thing.name,
+                'thingnecessity_set-%d-description' % i: 'description',
+                'thingnecessity_set-%d-count' % i: '5',
+                'thingnecessity_set-%d-price' % i: '10',
+            })
+        data['thingnecessity_set-1-DELETE'] = 'on'
+        self.client.post(reverse('projects:thing_necessity_update', args=[project.pk]), data)
+
+        self.assertEqual(list(project.thingnecessity_set.values_list('pk', 'count')), [(first.pk, 5)])
+        self.assertEqual(ProjectStats.objects.get(project=project).things_needed, 5)
+
+
+class TimeSupportApplyTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='volunteer')
+        self.client.force_login(self.user)
+        community = create_community(User.objects.create(username='admin'))
+        self.project = create_project(community)
+        self.url = reverse('projects:time_support_create', args=[self.project.pk])
+
+    def add_necessities(self, count):
+        today = timezone.now().date()
+        for i in range(count):
+            TimeNecessity.objects.create(
+                project=self.project, name='position %d' % i, description='', price=0,
+                start_date=today, end_date=today)
+
+    def add_questions(self, count):
+        start = self.project.question_set.count()
+        for i in range(start, start + count):
+            prototype = QuestionPrototype.objects.create(
+                text_bg='question %d' % i, text_en='question %d' % i, type='CharField', order=i)
+            Question.objects.create(prototype=prototype, project=self.project, order=i)
+
+    def get(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_queries(self):
+        """The application form takes the same queries however many positions and questions there are"""
+        self.add_necessities(2)
+        self.add_questions(2)
+        small = self.get()
+
+        self.add_necessities(10)
+        self.add_questions(10)
+        self.assertEqual(self.get(), small)
+
+    def test_apply(self):
+        """Applying saves the chosen positions and the answers, applying again updates the answers"""
+        self.add_necessities(2)
+        self.add_questions(2)
+        necessities = list(self.project.timenecessity_set.order_by('pk'))
+        questions = list(self.project.question_set.order_by('order'))
+
+        def apply(answer, necessity):
+            data = {
+                'form-TOTAL_FORMS': '1',
+                'form-INITIAL_FORMS': '0',
+                'necessity': [necessity.pk],
+                'form-0-necessity': necessity.pk,
+                'form-0-comment': 'comment',
+                'form-0-start_date': necessity.start_date,
+                'form-0-end_date': necessity.end_date,
+                'form-0-price': necessity.price,
+            }
+            for question in questions:
+                data['question_%d' % question.pk] = answer
+            return self.client.post(self.url, data)
+
+        self.assertEqual(apply('first', necessities[0]).status_code, 302)
+        self.assertEqual(list(TimeSupport.objects.values_list('necessity_id', flat=True)),
+                         [necessities[0].pk])
+        self.assertEqual(set(self.project.answer_set.values_list('answer', flat=True)), {'first'})
+
+        apply('second', necessities[1])
+        self.assertEqual(self.project.answer_set.count(), 2)
+        self.assertEqual(set(self.project.answer_set.values_list('answer', flat=True)), {'second'})
+
+    def test_save_answers(self):
+        """Answers are created, changed ones updated and unchanged ones left alone"""
+        self.add_questions(3)
+        first, second, third = self.project.question_set.order_by('order')
+        Answer.save_answers(self.project.pk, {first.pk: 'a', second.pk: 'b'})
+        unchanged = Answer.objects.get(question=first).updated_at
+
+        Answer.save_answers(self.project.pk, {first.pk: 'a', second.pk: 'c', third.pk: 'd'})
+
+        self.assertEqual(dict(self.project.answer_set.values_list('question_id', 'answer')),
+                         {first.pk: 'a', second.pk: 'c', third.pk: 'd'})
+        self.assertEqual(Answer.objects.get(question=first).updated_at, unchanged)
+
+    @skipUnless(sqlite3.sqlite_version_info >= (3, 24), 'SQLite has ON CONFLICT since 3.24')
+    def test_upsert_answers(self):
+        """The INSERT ... ON CONFLICT used on PostgreSQL creates and updates in one query"""
+        self.add_questions(2)
+        first, second = self.project.question_set.order_by('order')
+        Answer.objects.create(project=self.project, question=first, answer='old')
+
+        with CaptureQueriesContext(connection) as queries:
+            Answer.upsert_answers(self.project.pk, {first.pk: 'new', second.pk: 'b'}, timezone.now())
+
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(dict(self.project.answer_set.values_list('question_id', 'answer')),
+                         {first.pk: 'new', second.pk: 'b'})
+
+
+class ReportVoteTestCase(ProjectFixtureMixin, TestCase):
+    username = 'voter'
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+        self.report = self.add_report()
+
+    def add_report(self):
+        return Report.objects.create(
+            name='report', project=self.project, text='', published_at=timezone.now())
+
+    def counters(self):
+        report = Report.objects.get(pk=self.report.pk)
+        return report.num_vote_up, report.num_vote_down, report.vote_score
+
+    def test_toggle_vote(self):
+        """Voting, turning the vote around and removing it keep the counters in step"""
+        other = User.objects.create(username='other')
+        self.assertEqual(self.report.toggle_vote(self.user.pk, UP), (UP, 1, 0))
+        self.assertEqual(self.report.toggle_vote(other.pk, UP), (UP, 2, 0))
+        self.assertEqual(self.counters(), (2, 0, 2))
+
+        self.assertEqual(self.report.toggle_vote(self.user.pk, DOWN), (DOWN, 1, 1))
+        self.assertEqual(self.user.total_votes_count(), 1)
+
+        self.assertEqual(self.report.toggle_vote(self.user.pk, DOWN), (None, 1, 0))
+        self.assertEqual(self.counters(), (1, 0, 1))
+        self.assertEqual(self.user.total_votes_count(), 0)
+
+    def test_vote_endpoint(self):
+        """The JSON endpoint toggles the vote and answers with the tallies"""
+        url = reverse('projects:report_vote_toggle', args=[self.report.pk, 'up'])
+
+        self.assertEqual(self.client.get(url).status_code, 405)
+        self.assertEqual(self.client.post(
+            reverse('projects:report_vote_toggle', args=[self.report.pk, 'sideways'])).status_code, 404)
+
+        self.assertEqual(self.client.post(url).json(), {'voted': 'up', 'up': 1, 'down': 0})
+        self.assertEqual(self.client.post(url).json(), {'voted': None, 'up': 0, 'down': 0})
+        self.assertEqual(self.counters(), (0, 0, 0))
+
+    def test_vote_endpoint_anonymous(self):
+        """Anonymous votes get a JSON 401 instead of the sign in page"""
+        self.client.logout()
+        response = self.client.post(
+            reverse('projects:report_vote_toggle', args=[self.report.pk, 'up']))
+
+        self.assertEqual(response.status_code, 401)
+        self.assertIn('error', response.json())
+        self.assertEqual(self.counters(), (0, 0, 0))
+
+    def test_vote_link(self):
+        """The vote links toggle the vote too and go back to the report"""
+        response = self.client.get(reverse('projects:report_vote_down', args=[self.report.pk]))
+        self.assertRedirects(response, self.report.get_absolute_url(), fetch_redirect_response=False)
+        self.assertEqual(self.counters(), (0, 1, -1))
+
+    def test_voted_actions(self):
+        """The votes of the user on a list of reports take a single query"""
+        reports = [self.report] + [self.add_report() for i in range(3)]
+        reports[0].toggle_vote(self.user.pk, UP)
+        reports[2].toggle_vote(self.user.pk, DOWN)
+
+        with self.assertNumQueries(1):
+            voted = Report.voted_actions(self.user.pk, [report.pk for report in reports])
+
+        self.assertEqual(voted, {reports[0].pk: UP, reports[2].pk: DOWN})
+
+    def test_report_list(self):
+        """The report list shows which reports the user voted on without a query per report"""
+        url = reverse('projects:report_list', args=[self.project.pk])
+
+        def get():
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            return response, len(queries)
+
+        self.report.toggle_vote(self.user.pk, UP)
+        response, small = get()
+        self.assertContains(response, 'Гласувано', count=1)
+
+        for i in range(5):
+            self.add_report()
+        response, queries = get()
+        self.assertEqual(queries, small)
+        self.assertContains(response, 'Прочети и гласувай', count=5)
+
+    @override_settings(PAGE_SIZE=2)
+    def test_report_list_pages(self):
+        """Visitors who do not run the project can page through the published reports"""
+        for i in range(2):
+            self.add_report()
+        self.client.force_login(User.objects.create(username='visitor'))
+
+        response = self.client.get(reverse('projects:report_list', args=[self.project.pk]))
+        self.assertContains(response, '?before=%s' % response.context['next_cursor'])
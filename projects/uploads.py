@@ -0,0 +1,103 @@
+import os
+import posixpath
+import uuid
+
+import boto3
+from botocore.exceptions import ClientError
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.utils import timezone
+from django.utils.text import slugify
+from django.utils.translation import gettext as _
+
+from photologue.models import Photo
+
+from horodeya.storage_backends import MediaStorage
+from projects.photos import save_photo
+
+# Seconds the browser has to start the upload
+UPLOAD_EXPIRES = 600
+
+
+def s3_client():
+    # AWS_S3_ENDPOINT_URL points to a local stand-in like MinIO when set
+    return boto3.client(
+        's3',
+        region_name=settings.AWS_DEFAULT_REGION,
+        endpoint_url=settings.AWS_S3_ENDPOINT_URL,
+        aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+        aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+    )
+
+
+def bucket_key(name):
+    return posixpath.join(MediaStorage.location, name)
+
+
+def upload_directory(first_directory, second_directory):
+    return posixpath.join(first_directory, second_directory) + '/'
+
+
+def presign_upload(first_directory, second_directory, filename, content_type):
+    """
+    Lets the browser upload one photo straight to the bucket.
+
+    Returns the URL and the form fields of a presigned POST, and the name
+    the photo gets. The bucket itself rejects other content types, other
+    ACLs and files larger than PHOTO_UPLOAD_MAX_BYTES.
+    """
+    if content_type not in settings.PHOTO_UPLOAD_TYPES:
+        raise ValidationError(_('Only images can be uploaded'))
+
+    extension = os.path.splitext(filename)[1].lower()
+    name = upload_directory(first_directory, second_directory) + \
+        str(uuid.uuid4()).split('-')[0] + extension
+
+    post = s3_client().generate_presigned_post(
+        Bucket=settings.AWS_STORAGE_BUCKET_NAME,
+        Key=bucket_key(name),
+        Fields={'acl': 'public-read', 'Content-Type': content_type},
+        Conditions=[
+            {'acl': 'public-read'},
+            {'Content-Type': content_type},
+            ['content-length-range', 1, settings.PHOTO_UPLOAD_MAX_BYTES],
+        ],
+        ExpiresIn=UPLOAD_EXPIRES,
+    )
+
+    return {'url': post['url'], 'fields': post['fields'], 'name': name}
+
+
+def register_upload(first_directory, second_directory, name):
+    """
+    Makes a Photo of a finished direct upload, without transferring the file.
+
+    The object must be in the directory it was presigned for, and its size
+    and type are checked again. Whether it really is an image is checked by
+    the generate_photo_sizes worker, which also downscales it.
+    """
+    if posixpath.dirname(name) + '/' != upload_directory(first_directory, second_directory) \
+            or '..' in name:
+        raise ValidationError(_('Invalid upload'))
+
+    client = s3_client()
+    try:
+        head = client.head_object(
+            Bucket=settings.AWS_STORAGE_BUCKET_NAME, Key=bucket_key(name))
+    except ClientError:
+        raise ValidationError(_('The upload was not found'))
+
+    if head['ContentLength'] > settings.PHOTO_UPLOAD_MAX_BYTES \
+            or head['ContentType'] not in settings.PHOTO_UPLOAD_TYPES:
+        client.delete_object(
+            Bucket=settings.AWS_STORAGE_BUCKET_NAME, Key=bucket_key(name))
+        raise ValidationError(_('Only images can be uploaded'))
+
+    filename = posixpath.basename(name)
+    photo = Photo(title=filename, slug=slugify(filename))
+    photo.image = name
+    # Photo.save would download the file to read the date from its EXIF
+    photo.date_taken = timezone.now()
+
+    return save_photo(photo, prepare=True)
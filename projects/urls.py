@@ -40,6 +40,8 @@ urlpatterns = [
     path('report/<int:pk>/vote-up', views.report_vote_up, name='report_vote_up'),
     path('report/<int:pk>/vote-down',
          views.report_vote_down, name='report_vote_down'),
+    path('report/<int:pk>/vote/<str:action>',
+         views.report_vote_toggle, name='report_vote_toggle'),
     path('moneysupport/<int:pk>', views.MoneySupportDetails.as_view(),
          name='money_support_details'),
     path('<int:project_id>/moneysupport/create/',
@@ -97,6 +99,10 @@ urlpatterns = [
          views.questions_update, name='volunteer_questions_update'),
     path('<int:project_id>/gallery/update',
          views.gallery_update, name='gallery_update'),
+    path('photo/upload/<str:kind>/<int:pk>/start',
+         views.photo_upload_start, name='photo_upload_start'),
+    path('photo/upload/<str:kind>/<int:pk>/finish',
+         views.photo_upload_finish, name='photo_upload_finish'),
     path('donator/create/', views.DonatorDataCreate.as_view(),
          name='donator_create'),
     path('legalentitydonator/create/', views.LegalEntityDataCreate.as_view(),
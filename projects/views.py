@@ -4,12 +4,12 @@ import base64
 from hashlib import sha1
 import hmac
 
-from requests.exceptions import Timeout, ConnectionError
-
 from django.utils import timezone
 
+from django.conf import settings
 from django.contrib import messages
-from django.http import HttpResponse, HttpResponseRedirect
+from django.core.exceptions import PermissionDenied
+from django.http import Http404, HttpResponse, HttpResponseRedirect, JsonResponse
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse
@@ -17,8 +17,9 @@ from django.views import generic
 from django.utils import timezone
 from django.utils.text import slugify
 from django.utils.html import format_html
-from django.forms import ModelForm, ValidationError, inlineformset_factory, modelformset_factory
+from django.forms import ModelForm, ValidationError, BaseInlineFormSet, BaseModelFormSet, inlineformset_factory, modelformset_factory
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 
 from django import forms
 from django.db.models import Q
@@ -30,9 +31,17 @@ from django.utils.translation import gettext as _
 
 from rules.contrib.views import AutoPermissionRequiredMixin, permission_required, objectgetter, PermissionRequiredMixin
 
-from projects.models import Project, Community, Report, MoneySupport, TimeSupport, User, Announcement, TimeNecessity, ThingNecessity, Question, QuestionPrototype, DonatorData, LegalEntityDonatorData, BugReport, EpayMoneySupport
+from projects.models import Project, Community, Report, MoneySupport, TimeSupport, User, Announcement, TimeNecessity, ThingNecessity, Question, QuestionPrototype, DonatorData, LegalEntityDonatorData, BugReport, EpayMoneySupport, ProjectStats, load_cache_versions, project_cache_version_key
 
 from projects.forms import QuestionForm, PaymentForm, ProjectUpdateForm, BugReportForm, EpayMoneySupportForm
+from projects.notifier import notify_users
+from projects.feeds import get_feed_backend
+from projects.pagination import KeysetPaginationMixin, get_cursor, keyset_page
+from projects.photos import mark_pending, prepare_upload, save_photo
+from projects.signals import bump_after_commit
+from projects.uploads import presign_upload, register_upload
+from horodeya.context_processors import stream_token_stats
+from horodeya.page_cache import cached_page
 
 from tempus_dominus.widgets import DateTimePicker, DatePicker
 
@@ -42,17 +51,13 @@ from photologue.models import Photo, Gallery
 
 from dal import autocomplete
 
-from stream_django.feed_manager import feed_manager
-from stream_django.enrich import Enrich
 from django.contrib.auth.mixins import UserPassesTestMixin
 
-from stream_django.feed_manager import feed_manager
-from stream_django.enrich import Enrich
-
 from notifications.signals import notify
 from notifications.models import Notification
 from django.utils.translation import gettext, gettext_lazy as _
-from django.db import IntegrityError
+from django.db import IntegrityError, transaction
+
 
 
 def short_random():
@@ -134,9 +139,38 @@ class AnnouncementForm(ModelForm):
         }
 
 
+class LoadedObjectsFormsetMixin:
+    """Finds the objects of the posted ids among the ones the formset has loaded in one query"""
+
+    def add_fields(self, form, index):
+        super().add_fields(form, index)
+
+        # The id field would otherwise run a query per form
+        field = form.fields[self.model._meta.pk.name]
+        pk_field = self.model._meta.pk
+
+        def to_python(value):
+            if value in field.empty_values:
+                return None
+            try:
+                obj = self._existing_object(pk_field.to_python(value))
+            except ValidationError:
+                obj = None
+            if obj is None:
+                raise ValidationError(field.error_messages['invalid_choice'], code='invalid_choice')
+            return obj
+
+        field.to_python = to_python
+
+
+class BaseNecessityFormset(LoadedObjectsFormsetMixin, BaseInlineFormSet):
+    pass
+
+
 TimeNecessityFormset = inlineformset_factory(
     Project,
     TimeNecessity,
+    formset=BaseNecessityFormset,
     fields=['name', 'description', 'count', 'price', 'start_date', 'end_date'],
     widgets={
         'count': forms.TextInput({
@@ -178,6 +212,7 @@ TimeNecessityFormset = inlineformset_factory(
 TimeNecessityFormsetWithRow = inlineformset_factory(
     Project,
     TimeNecessity,
+    formset=BaseNecessityFormset,
     fields=['name', 'description', 'count', 'price', 'start_date', 'end_date'],
     widgets={
         'count': forms.TextInput({
@@ -219,6 +254,7 @@ TimeNecessityFormsetWithRow = inlineformset_factory(
 ThingNecessityFormset = inlineformset_factory(
     Project,
     ThingNecessity,
+    formset=BaseNecessityFormset,
     fields=['name', 'description', 'count', 'price'],
     widgets={
         'count': forms.TextInput({
@@ -239,6 +275,7 @@ ThingNecessityFormset = inlineformset_factory(
 ThingNecessityFormsetWithRow = inlineformset_factory(
     Project,
     ThingNecessity,
+    formset=BaseNecessityFormset,
     fields=['name', 'description', 'count', 'price'],
     widgets={
         'count': forms.TextInput({
@@ -269,6 +306,43 @@ def time_necessity_update(request, project_id):
     return necessity_update(request, project_id, 'time')
 
 
+def save_necessities(project, formset):
+    """
+    Saves the necessity formset with one query per kind of change.
+
+    The rows are written with bulk_create and bulk_update, so the project
+    stats and fragments are refreshed once here instead of by the signals of
+    every row. A project gets its default questions with its first necessity.
+    """
+    model = formset.model
+    now = timezone.now()
+
+    with transaction.atomic():
+        formset.save(commit=False)
+
+        for necessity in formset.deleted_objects:
+            necessity.delete()
+
+        for necessity in formset.new_objects:
+            necessity.created_at = necessity.updated_at = now
+        model.objects.bulk_create(formset.new_objects)
+
+        changed_fields = {'updated_at'}
+        for necessity, fields in formset.changed_objects:
+            necessity.updated_at = now
+            changed_fields.update(fields)
+        model.objects.bulk_update(
+            [necessity for necessity, fields in formset.changed_objects], changed_fields)
+
+        if formset.new_objects or formset.changed_objects:
+            ProjectStats.refresh(project.pk)
+            bump_after_commit([project.pk])
+
+        if any(form.cleaned_data.get('name') and not form.cleaned_data.get('DELETE')
+               for form in formset):
+            project.add_default_questions()
+
+
 def necessity_update(request, project_id, type):
     cls = TimeNecessityFormset if type == 'time' else ThingNecessityFormset
     template_name = 'projects/necessity_form.html'
@@ -289,22 +363,7 @@ def necessity_update(request, project_id, type):
     elif request.method == 'POST':
         formset = cls(request.POST, instance=project)
         if formset.is_valid():
-            for form in formset:
-                if form.cleaned_data.get('DELETE'):
-                    form.instance.delete()
-
-                elif form.cleaned_data.get('name'):
-                    form.instance.project = project
-                    if(project.question_set.count() == 0):
-                        prototypes = QuestionPrototype.objects.all()
-                        order = 1
-                        for prototype in prototypes:
-                            question = Question(
-                                prototype=prototype, project=project, order=order)
-                            question.save()
-                            project.question_set.add(question)
-                            order += 1
-                    form.save()
+            save_necessities(project, formset)
             if 'add-row' in request.POST:
                 if (type == 'thing'):
                     formset = ThingNecessityFormsetWithRow(
@@ -327,23 +386,28 @@ def necessity_update(request, project_id, type):
 class ProjectDetails(AutoPermissionRequiredMixin, generic.DetailView):
     model = Project
 
+    def get(self, request, *args, **kwargs):
+        return cached_page(
+            request, [project_cache_version_key(kwargs['pk'])],
+            lambda: super(ProjectDetails, self).get(request, *args, **kwargs),
+            last_modified=lambda: self.object.updated_at)
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
+        # the stats and the gallery fragments share the version
+        load_cache_versions([context['object']])
         show_admin = self.request.GET.get('show_admin', 'True') == 'True'
         can_be_admin = self.request.user.is_authenticated and self.request.user.member_of(
             context['object'].community_id)
         context['admin'] = show_admin and can_be_admin
         context['can_be_admin'] = can_be_admin
 
-        try:
-            feed = feed_manager.get_feed('project', context['object'].id)
-            enricher = Enrich()
-            timeline = enricher.enrich_activities(
-                feed.get(limit=25)['results'])
-            context['timeline'] = timeline
-        except (Timeout, ConnectionError):
-            messages.error(_('Could not get timeline'))
-            context['timeline'] = None
+        timeline, next_cursor = get_feed_backend().project_timeline(
+            context['object'], limit=settings.PAGE_SIZE, before=get_cursor(self.request))
+        if timeline is None:
+            messages.error(self.request, _('Could not get timeline'))
+        context['timeline'] = timeline
+        context['next_cursor'] = next_cursor
 
         context['announcement_form'] = AnnouncementForm()
 
@@ -358,7 +422,7 @@ class ProjectCreate(AutoPermissionRequiredMixin, UserPassesTestMixin, CreateView
         return redirect('/projects/community/create')
 
     def test_func(self):
-        return self.request.user.communities.count() > 0
+        return len(self.request.user.community_ids()) > 0
 
     def get_form_kwargs(self):
         kwargs = super().get_form_kwargs()
@@ -382,6 +446,7 @@ class ProjectCreate(AutoPermissionRequiredMixin, UserPassesTestMixin, CreateView
         # return super().form_invalid(form)
 
         project.type = self.kwargs['type']
+        response = super().form_valid(form)
 
         # Потребител 0 следва всички проекти
         user_follow_project(0, project)
@@ -389,9 +454,8 @@ class ProjectCreate(AutoPermissionRequiredMixin, UserPassesTestMixin, CreateView
         horodeya_admins = User.objects.filter(is_superuser=True)
         notification_text = '%s подаде заявка за проекта %s от общност %s' % (
             user, project, community)
-        notify.send(self.request.user, recipient=horodeya_admins,
-                    verb=notification_text)
-        return super().form_valid(form)
+        notify_users(self.request.user, horodeya_admins, notification_text)
+        return response
 
 
 class ProjectUpdate(AutoPermissionRequiredMixin, UpdateView):
@@ -439,6 +503,7 @@ class CommunityCreate(AutoPermissionRequiredMixin, CreateView):
         community = form.save(commit=False)
         community.save()
         user.communities.add(community)
+        user.forget_communities()
         return super().form_valid(form)
 
 
@@ -449,8 +514,9 @@ class CommunityUpdate(AutoPermissionRequiredMixin, UpdateView):
 
     def form_valid(self, form):
         admin = form.instance.admin
-        if not admin.communities.filter(pk=form.instance.pk).exists():
+        if not admin.member_of(form.instance.pk):
             admin.communities.add(form.instance)
+            forget_communities(self.request, admin)
 
         return super().form_valid(form)
 
@@ -476,7 +542,7 @@ def community_details(request, pk):
     return render(request, 'projects/community_detail.html', {'object': community})
 
 
-class CommunityList(AutoPermissionRequiredMixin, generic.ListView):
+class CommunityList(AutoPermissionRequiredMixin, KeysetPaginationMixin, generic.ListView):
     permission_type = 'view'
     model = Community
 
@@ -493,12 +559,19 @@ class CommunityMemberList(AutoPermissionRequiredMixin, generic.DetailView):
         return context
 
 
+def forget_communities(request, user):
+    user.forget_communities()
+    if request.user.pk == user.pk:
+        request.user.forget_communities()
+
+
 @permission_required('projects.change_community', fn=objectgetter(Community, 'community_id'))
 def community_member_add(request, community_id):
     user_id = request.POST.get('user')
     user = get_object_or_404(User, pk=user_id)
     community = get_object_or_404(Community, pk=community_id)
     user.communities.add(community)
+    forget_communities(request, user)
     messages.success(request, _("Success"))
 
     return redirect('projects:community_member_list', community_id)
@@ -509,6 +582,7 @@ def community_member_remove(request, community_id, user_id):
     user = get_object_or_404(User, pk=user_id)
     community = get_object_or_404(Community, pk=community_id)
     user.communities.remove(community)
+    forget_communities(request, user)
     messages.success(request, _("Success"))
 
     return redirect('projects:community_member_list', community_id)
@@ -578,17 +652,17 @@ class ReportDetails(AutoPermissionRequiredMixin, generic.DetailView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         report = kwargs['object']
-        context['votes_up'] = report.votes.count(UP)
-        context['votes_down'] = report.votes.count(DOWN)
-        vote = report.votes.get(self.request.user.pk)
+        context['votes_up'] = report.num_vote_up
+        context['votes_down'] = report.num_vote_down
+        action = Report.voted_actions(self.request.user.pk, [report.pk]).get(report.pk)
 
         not_voted_classes = 'btn-light'
         voted_classes = 'btn-primary'
         vote_up_classes = not_voted_classes
         vote_down_classes = not_voted_classes
 
-        if vote:
-            if vote.action == UP:
+        if action is not None:
+            if action == UP:
                 vote_up_classes = voted_classes
             else:
                 vote_down_classes = voted_classes
@@ -610,8 +684,13 @@ class ReportList(AutoPermissionRequiredMixin, generic.ListView):
         project_pk = self.kwargs['project']
         context['project'] = get_object_or_404(Project, pk=project_pk)
 
-        context['reports'] = Report.objects.filter(
-            project_id=project_pk, published_at__lte=now)
+        context['reports'], context['next_cursor'] = keyset_page(
+            Report.objects.filter(project_id=project_pk, published_at__lte=now),
+            get_cursor(self.request), ordering=('-published_at', '-id'))
+
+        voted = Report.voted_actions(self.request.user.pk, [report.pk for report in context['reports']])
+        for report in context['reports']:
+            report.voted = report.pk in voted
         context['unpublished_reports'] = Report.objects.filter(
             project_id=project_pk, published_at__gt=now)
 
@@ -629,30 +708,39 @@ def report_vote_down(request, pk):
 @login_required
 # TODO must be a subscriber to vote
 def report_vote(request, pk, action):
-    user = request.user
     report = get_object_or_404(Report, pk=pk)
+    voted, votes_up, votes_down = report.toggle_vote(request.user.pk, action)
 
-    if report.votes.exists(user.pk, action=action):
-        success = report.votes.delete(user.pk)
-        if not success:
-            messages.error(request, _('Could not delete vote'))
+    if voted is None:
+        messages.success(request, _('Deleted vote'))
+    else:
+        messages.success(request, _('Voted up')
+                         if action == UP else _('Voted down'))
 
-        else:
-            messages.success(request, _('Deleted vote'))
+    return redirect(report)
 
-    else:
-        if action == UP:
-            success = report.votes.up(user.pk)
-        else:
-            success = report.votes.down(user.pk)
 
-        if not success:
-            messages.error(request, _('Could not vote'))
-        else:
-            messages.success(request, _('Voted up')
-                             if action == UP else _('Voted down'))
+VOTE_ACTIONS = {'up': UP, 'down': DOWN}
 
-    return redirect(report)
+
+@require_POST
+def report_vote_toggle(request, pk, action):
+    """Toggles the vote like report_vote, answers with the new tallies instead of the page"""
+    if action not in VOTE_ACTIONS:
+        raise Http404
+
+    # login_required would redirect the script to the sign in page
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Authentication required'}, status=401)
+
+    report = get_object_or_404(Report, pk=pk)
+    voted, votes_up, votes_down = report.toggle_vote(request.user.pk, VOTE_ACTIONS[action])
+
+    return JsonResponse({
+        'voted': None if voted is None else ('up' if voted == UP else 'down'),
+        'up': votes_up,
+        'down': votes_down,
+    })
 
 
 class MoneySupportForm(ModelForm):
@@ -792,8 +880,8 @@ def money_support_crud(request, project_id=None, support_id=None):
                         communities__id=community_id_project)
                     notification_message = '%s подаде заявка за парична подкрепа към %s' % (
                         request.user, project)
-                    notify.send(request.user,
-                                recipient=community_members, verb=notification_message)
+                    notify_users(request.user, community_members,
+                                 notification_message)
 
                     return redirect(form.instance)
 
@@ -828,33 +916,6 @@ class TimeSupportDelete(AutoPermissionRequiredMixin, DeleteView):
         return reverse_lazy('projects:details', kwargs={'pk': self.object.project.pk})
 
 
-def report_vote(request, pk, action):
-    user = request.user
-    report = get_object_or_404(Report, pk=pk)
-
-    if report.votes.exists(user.pk, action=action):
-        success = report.votes.delete(user.pk)
-        if not success:
-            messages.error(request, _('Could not delete vote'))
-
-        else:
-            messages.success(request, _('Deleted vote'))
-
-    else:
-        if action == UP:
-            success = report.votes.up(user.pk)
-        else:
-            success = report.votes.down(user.pk)
-
-        if not success:
-            messages.error(request, _('Could not vote'))
-        else:
-            messages.success(request, _('Voted up')
-                             if action == UP else _('Voted down'))
-
-    return redirect(report)
-
-
 def get_support(pk, type):
     if type in ['money', 'm']:
         support = get_object_or_404(MoneySupport, pk=pk)
@@ -974,15 +1035,19 @@ class TimeSupportDetails(AutoPermissionRequiredMixin, generic.DetailView):
 def user_support_list(request, user_id, type):
     user = get_object_or_404(User, pk=user_id)
     if type == 'time':
-        support_list = user.timesupport_set.order_by('-status_since')
+        support_list = user.timesupport_set.all()
 
     else:
-        support_list = user.moneysupport_set.order_by('-status_since')
+        support_list = user.moneysupport_set.all()
+
+    support_list, next_cursor = keyset_page(
+        support_list.select_related('necessity'), get_cursor(request), ordering=('-status_since', '-id'))
 
     return render(request, 'projects/user_support_list.html', context={
         'account': user,
         'type': type,
         'support_list': support_list,
+        'next_cursor': next_cursor,
     }
     )
 
@@ -1065,13 +1130,7 @@ def follow_project(request, pk):
 
 
 def user_follow_project(user_id, project):
-    news_feeds = feed_manager.get_news_feeds(user_id)
-
-    for feed in news_feeds.values():
-        feed.follow('project', project.id)
-
-    notification_feed = feed_manager.get_notification_feed(user_id)
-    notification_feed.follow('project', project.id)
+    get_feed_backend().follow_project(user_id, project)
 
 
 class AnnouncementCreate(PermissionRequiredMixin, CreateView):
@@ -1124,52 +1183,85 @@ def time_support_create(request, project_id):
     return time_support_create_update(request, project)
 
 
+class BaseTimeSupportFormset(LoadedObjectsFormsetMixin, BaseModelFormSet):
+    """
+    The volunteer applications of a user, with an extra form for each
+    necessity they have not applied for yet. The necessities are passed in
+    loaded so the necessity fields do not run a query per form.
+    """
+
+    def __init__(self, *args, extra=0, necessities=None, **kwargs):
+        self.extra = extra
+        self.necessities = necessities or {}
+        super().__init__(*args, **kwargs)
+
+    def add_fields(self, form, index):
+        super().add_fields(form, index)
+
+        field = form.fields['necessity']
+
+        def to_python(value):
+            if value in field.empty_values:
+                return None
+            necessity = self.necessities.get(int(value)) if str(value).isdigit() else None
+            if necessity is None:
+                raise ValidationError(field.error_messages['invalid_choice'], code='invalid_choice')
+            return necessity
+
+        field.to_python = to_python
+
+
+TimeSupportFormset = modelformset_factory(
+    TimeSupport,
+    formset=BaseTimeSupportFormset,
+    fields=['necessity', 'comment', 'start_date', 'end_date', 'price'],
+    labels={'comment': _(
+            'Why do you apply for this position? List your relevant experience / skills')},
+    widgets={
+        'start_date': forms.HiddenInput(),
+        'end_date': forms.HiddenInput(),
+        'price': forms.HiddenInput(),
+        'comment': forms.Textarea(
+            attrs={
+                'rows': 1,
+                'cols': 30,
+            },
+        )})
+
+
 def time_support_create_update(request, project, support=None):
     context = {}
     context['project'] = project
-    queryset = TimeSupport.objects.filter(project=project, user=request.user)
-    applied_necessities = set(map(lambda ts: ts.necessity, queryset.all()))
+    queryset = TimeSupport.objects.filter(
+        project=project, user=request.user).select_related('necessity')
+    applied_necessities = set(queryset.values_list('necessity_id', flat=True))
     answers = project.answer_set.all()
 
     community_id = project.community_id
     community_members = User.objects.filter(
         communities__id=community_id)
 
-    necessity_list = project.timenecessity_set.all()
-    necessity_list = list(
-        filter(lambda n: n not in applied_necessities, necessity_list))
-
-    TimeSupportFormset = modelformset_factory(
-        TimeSupport,
-        fields=['necessity', 'comment', 'start_date', 'end_date', 'price'],
-        labels={'comment': _(
-                'Why do you apply for this position? List your relevant experience / skills')},
-        widgets={
-            'start_date': forms.HiddenInput(),
-            'end_date': forms.HiddenInput(),
-            'price': forms.HiddenInput(),
-            'comment': forms.Textarea(
-                attrs={
-                    'rows': 1,
-                    'cols': 30,
-                },
-            )},
-        extra=len(necessity_list))
+    necessities = {necessity.pk: necessity for necessity in project.timenecessity_set.all()}
+    necessity_list = [necessity for pk, necessity in necessities.items()
+                      if pk not in applied_necessities]
+    formset_kwargs = {'extra': len(necessity_list), 'necessities': necessities}
 
     initial = list(map(lambda n: {'necessity': n, 'start_date': n.start_date,
                                   'end_date': n.end_date, 'price': n.price}, necessity_list))
-    questions = project.question_set.order_by('order').all()
+    questions = project.question_set.select_related('prototype').order_by('order')
     if request.method == 'GET':
         formset = TimeSupportFormset(
             queryset=queryset,
-            initial=initial)
+            initial=initial,
+            **formset_kwargs)
         question_form = QuestionForm(questions=questions, answers=answers)
 
     elif request.method == 'POST':
         formset = TimeSupportFormset(
             request.POST,
             queryset=queryset,
-            initial=None)
+            initial=None,
+            **formset_kwargs)
 
         question_form = QuestionForm(request.POST, questions=questions)
 
@@ -1196,8 +1288,8 @@ def time_support_create_update(request, project, support=None):
                 messages.success(request, _(
                     'Applied to %d volunteer positions' % saved))
 
-                notify.send(request.user, recipient=community_members,
-                            verb='%s подаде заявка за доброволстване към %s' % (request.user, project))
+                notify_users(request.user, community_members,
+                             '%s подаде заявка за доброволстване към %s' % (request.user, project))
                 return redirect(project)
 
     context['formset'] = formset
@@ -1221,7 +1313,8 @@ class TimeNecessityList(AutoPermissionRequiredMixin, generic.ListView):
         context['necessity_list'] = project.timenecessity_set.all()
         context['type'] = 'time'
 
-        context['member'] = self.request.user.member_of(project.community.pk)
+        context['member'] = self.request.user.is_authenticated and self.request.user.member_of(
+            project.community_id)
 
         return context
 
@@ -1240,7 +1333,8 @@ class ThingNecessityList(AutoPermissionRequiredMixin, generic.ListView):
         context['necessity_list'] = project.thingnecessity_set.all()
         context['type'] = 'thing'
 
-        context['member'] = self.request.user.member_of(project.community.pk)
+        context['member'] = self.request.user.is_authenticated and self.request.user.member_of(
+            project.community_id)
 
         return context
 
@@ -1270,8 +1364,13 @@ class UploadFileForm(forms.Form):
     delete = forms.BooleanField(initial=False, required=False)
 
 
+class BasePhotoFormset(LoadedObjectsFormsetMixin, BaseModelFormSet):
+    pass
+
+
 PhotoFormset = modelformset_factory(
     Photo,
+    formset=BasePhotoFormset,
     fields=['image'],
     extra=1,
     can_delete=True,
@@ -1281,6 +1380,7 @@ PhotoFormset = modelformset_factory(
 def neat_photo(first_directory, second_directory, image):
     path, extension = os.path.splitext(image.name)
     image.name = short_random() + extension
+    image = prepare_upload(image)
 
     photo = Photo()
     photo.title = image.name
@@ -1291,15 +1391,10 @@ def neat_photo(first_directory, second_directory, image):
     photo.first_directory = first_directory
     photo.second_directory = second_directory
 
-    photo.save()
+    return save_photo(photo)
 
-    return photo
-
-
-def gallery_update(request, project_id):
-    template_name = 'projects/photo_form.html'
-    project = get_object_or_404(Project, pk=project_id)
 
+def project_gallery(project):
     # TODO make project.name unique
     gallery, created = Gallery.objects.get_or_create(
         title=project.name,
@@ -1311,6 +1406,123 @@ def gallery_update(request, project_id):
         project.gallery = gallery
         project.save()
 
+    return gallery
+
+
+def add_gallery_photo(gallery, photo, order):
+    # Creating the through row directly sets the sort order in one INSERT
+    gallery.photos.through.objects.create(
+        gallery=gallery, photo=photo, sort_value=order)
+
+
+def replace_photo(owner, photo):
+    """Sets the photo of a user or a community, deleting the old one"""
+    if owner.photo:
+        owner.photo.delete()
+
+    owner.photo = photo
+    owner.save()
+
+
+def photo_upload_target(request, kind, pk):
+    """Returns the object a direct upload is for and how to attach the photo to it"""
+    user = request.user
+
+    if kind == 'project':
+        project = get_object_or_404(Project, pk=pk)
+        if not (user.is_authenticated and user.member_of(project.community_id)):
+            raise PermissionDenied
+
+        def attach(photo):
+            gallery = project_gallery(project)
+            add_gallery_photo(gallery, photo, gallery.photos.count())
+        return project, attach
+
+    if kind == 'user':
+        owner = get_object_or_404(User, pk=pk)
+        if not user.has_perm('projects.change_user', owner):
+            raise PermissionDenied
+        return owner, lambda photo: replace_photo(owner, photo)
+
+    if kind == 'community':
+        owner = get_object_or_404(Community, pk=pk)
+        if not user.has_perm('projects.change_community', owner):
+            raise PermissionDenied
+        return owner, lambda photo: replace_photo(owner, photo)
+
+    raise Http404
+
+
+@require_POST
+def photo_upload_start(request, kind, pk):
+    """Presigns a direct upload of a photo from the browser to the bucket"""
+    photo_upload_target(request, kind, pk)
+
+    try:
+        upload = presign_upload(kind, str(pk), request.POST.get('filename', ''),
+                                request.POST.get('content_type', ''))
+    except ValidationError as e:
+        return JsonResponse({'error': ' '.join(e.messages)}, status=400)
+
+    return JsonResponse(upload)
+
+
+@require_POST
+def photo_upload_finish(request, kind, pk):
+    """Makes a photo of a finished direct upload and attaches it"""
+    owner, attach = photo_upload_target(request, kind, pk)
+
+    try:
+        photo = register_upload(kind, str(pk), request.POST.get('name', ''))
+    except ValidationError as e:
+        return JsonResponse({'error': ' '.join(e.messages)}, status=400)
+
+    attach(photo)
+    messages.success(request, _('Image uploaded'))
+    return JsonResponse({'redirect': owner.get_absolute_url()})
+
+
+def save_gallery_order(gallery, project, formset, files):
+    """
+    Applies the photo formset to the gallery.
+
+    The new order is computed in memory and written with one bulk_update of
+    the through rows, new photos get theirs with one bulk_create.
+    """
+    Through = gallery.photos.through
+
+    with transaction.atomic():
+        rows = {row.photo_id: row for row in Through.objects.filter(gallery=gallery)}
+        changed = []
+        added = []
+
+        for form in formset:
+            image = files.get("%s-image" % (form.prefix))
+            order = form.cleaned_data.get('ORDER', len(formset))
+            if form.instance.id and form.cleaned_data.get('DELETE'):
+                form.instance.delete()
+            elif image:
+                photo = neat_photo('project', str(project.pk), image)
+                added.append(Through(gallery=gallery, photo=photo, sort_value=order))
+            elif form.instance.image:
+                row = rows.get(form.instance.pk)
+                if row is not None and row.sort_value != order:
+                    row.sort_value = order
+                    changed.append(row)
+
+        Through.objects.bulk_update(changed, ['sort_value'])
+        Through.objects.bulk_create(added)
+
+        # The bulk queries send no signals for the gallery fragment
+        if changed or added:
+            bump_after_commit([project.pk])
+
+
+def gallery_update(request, project_id):
+    template_name = 'projects/photo_form.html'
+    project = get_object_or_404(Project, pk=project_id)
+    gallery = project_gallery(project)
+
     if request.method == 'GET':
         # we don't want to display the already saved model instances
         formset = PhotoFormset(queryset=gallery.photos.all())
@@ -1318,31 +1530,15 @@ def gallery_update(request, project_id):
     elif request.method == 'POST':
         formset = PhotoFormset(request.POST, queryset=gallery.photos.all())
         if formset.is_valid():
-            for form in formset:
-                image = request.FILES.get("%s-image" % (form.prefix))
-                order = form.cleaned_data.get('ORDER', len(formset))
-                if form.instance.id and form.cleaned_data.get('DELETE'):
-                    form.instance.delete()
-                elif image:
-                    photo = neat_photo('project', str(project_id), image)
-                    photo.galleries.add(gallery)
-
-                    through = gallery.photos.through.objects.get(
-                        photo_id=photo.pk, gallery_id=gallery.pk)
-                    through.sort_value = order
-                    through.save()
-                elif form.instance.image:
-                    image = form.instance
-                    through = gallery.photos.through.objects.get(
-                        photo_id=image.pk, gallery_id=gallery.pk)
-                    through.sort_value = order
-                    through.save()
-
+            save_gallery_order(gallery, project, formset, request.FILES)
             return redirect(project)
 
+    mark_pending(form.instance for form in formset if form.instance.pk)
+
     return render(request, 'projects/photo_form.html', {
         'formset': formset,
         'project': project,
+        'direct_uploads': settings.DIRECT_UPLOADS,
     })
 
 
@@ -1356,15 +1552,12 @@ def user_photo_update(request, user_id):
             title = str(user)
             slug = slugify(title, allow_unicode=True)
 
-            if user.photo:
-                user.photo.delete()
-
             if form.cleaned_data.get('delete'):
+                replace_photo(user, None)
                 messages.success(request, _('Image deleted'))
-            else:
-                user.photo = neat_photo('user', str(
-                    user_id), request.FILES['file'])
-                user.save()
+            elif request.FILES.get('file'):
+                replace_photo(user, neat_photo('user', str(
+                    user_id), request.FILES['file']))
 
                 messages.success(request, _('Image uploaded'))
             next = request.GET.get('next')
@@ -1376,7 +1569,8 @@ def user_photo_update(request, user_id):
         form = UploadFileForm(
             initial={'file': user.photo.image if user.photo else None})
 
-    return render(request, 'projects/user_photo_update.html', {'form': form, 'user': user})
+    return render(request, 'projects/user_photo_update.html', {
+        'form': form, 'user': user, 'direct_uploads': settings.DIRECT_UPLOADS})
 
 
 @permission_required('projects.change_community', fn=objectgetter(Community, 'pk'))
@@ -1388,15 +1582,12 @@ def community_photo_update(request, pk):
             title = str(community)
             slug = slugify(title, allow_unicode=True)
 
-            if community.photo:
-                community.photo.delete()
-
             if form.cleaned_data.get('delete'):
+                replace_photo(community, None)
                 messages.success(request, _('Image deleted'))
-            else:
-                community.photo = neat_photo(
-                    'community', str(pk), request.FILES['file'])
-                community.save()
+            elif request.FILES.get('file'):
+                replace_photo(community, neat_photo(
+                    'community', str(pk), request.FILES['file']))
 
                 messages.success(request, _('Image uploaded'))
 
@@ -1410,7 +1601,8 @@ def community_photo_update(request, pk):
         #     initial={'file': community.photo.image if community.photo else None})
         form = UploadFileForm()
 
-    return render(request, 'projects/community_photo_update.html', {'form': form, 'community': community})
+    return render(request, 'projects/community_photo_update.html', {
+        'form': form, 'community': community, 'direct_uploads': settings.DIRECT_UPLOADS})
 
 
 @permission_required('projects.change_question', fn=objectgetter(Project, 'project_id'))
@@ -1539,29 +1731,28 @@ class LegalEntityDataCreate(AutoPermissionRequiredMixin, CreateView):
 def feed(request):
     user = request.user
 
-    if user.is_authenticated:
-        feed = feed_manager.get_feed('timeline', user.id)
-    else:
-        feed = feed_manager.get_feed('timeline', 0)
-
-    enricher = Enrich()
-    timeline = enricher.enrich_activities(feed.get(limit=25)['results'])
+    timeline, next_cursor = get_feed_backend().user_timeline(
+        user.id if user.is_authenticated else 0,
+        limit=settings.PAGE_SIZE,
+        before=get_cursor(request))
 
-    return render(request, 'projects/feed.html', {'timeline': timeline})
+    return render(request, 'projects/feed.html', {'timeline': timeline, 'next_cursor': next_cursor})
 
 
 def notifications_feed(request):
     user = request.user
-    notifications = user.notifications.unread()
+    notifications, next_cursor = keyset_page(
+        user.notifications.unread(), get_cursor(request), ordering=('-timestamp', '-id'))
 
-    return render(request, 'projects/notifications.html', {'notifications': notifications})
+    return render(request, 'projects/notifications.html', {'notifications': notifications, 'next_cursor': next_cursor})
 
 
 def notifications_read(request):
     user = request.user
-    notifications_read = user.notifications.read()
+    notifications_read, next_cursor = keyset_page(
+        user.notifications.read(), get_cursor(request), ordering=('-timestamp', '-id'))
 
-    return render(request, 'projects/notifications_read.html', {'notifications': notifications_read})
+    return render(request, 'projects/notifications_read.html', {'notifications': notifications_read, 'next_cursor': next_cursor})
 
 
 def notifications_mark_as_read(request):
@@ -1573,8 +1764,9 @@ def notifications_mark_as_read(request):
 
 @user_passes_test(lambda u: u.is_superuser)
 def unverified_cause_list(request):
-    unverified_causes = Project.objects.filter(verified_status='review')
-    return render(request, 'projects/unverified_causes.html', {'items': unverified_causes})
+    unverified_causes, next_cursor = keyset_page(
+        Project.objects.filter(verified_status='review'), get_cursor(request))
+    return render(request, 'projects/unverified_causes.html', {'items': unverified_causes, 'next_cursor': next_cursor})
 
 
 class ProjectVerify(AutoPermissionRequiredMixin, UserPassesTestMixin, UpdateView):
@@ -1592,11 +1784,11 @@ class ProjectVerify(AutoPermissionRequiredMixin, UserPassesTestMixin, UpdateView
             communities__id=community_id)
 
         if(project.verified_status == 'accepted'):
-            notify.send(self.request.user, recipient=community_members,
-                        verb='Задругата %s беше одобрена' % (project))
+            notify_users(self.request.user, community_members,
+                         'Задругата %s беше одобрена' % (project))
         elif(project.verified_status == 'rejected'):
-            notify.send(self.request.user, recipient=community_members,
-                        verb='Задругата %s беше отхвърлена' % (project))
+            notify_users(self.request.user, community_members,
+                         'Задругата %s беше отхвърлена' % (project))
         return super().form_valid(form)
 
 
@@ -1623,13 +1815,14 @@ def bug_report_create(request):
 
 @user_passes_test(lambda u: u.is_superuser)
 def administration(request):
-    return render(request, 'projects/administration.html')
+    return render(request, 'projects/administration.html', {'stream_token_stats': stream_token_stats()})
 
 
 @user_passes_test(lambda u: u.is_superuser)
 def received_bug_reports(request):
-    bug_reports = BugReport.objects.all()
-    return render(request, 'projects/bug_reports.html', {'reports': bug_reports})
+    bug_reports, next_cursor = keyset_page(
+        BugReport.objects.all(), get_cursor(request))
+    return render(request, 'projects/bug_reports.html', {'reports': bug_reports, 'next_cursor': next_cursor})
 
 
 def create_epay_support(request, pk):